@@ -1,11 +1,13 @@
 from __future__ import print_function
 import collections
+import copy
 
 import numpy as np
 from PyQt5.QtGui import QColor
 
 # from ..db.DbReader import dict_factory, read_residue_db
 from ..db.DbReader import read_residue_db
+from .SparseSeries import SparseSeries
 
 
 compare = lambda x, y: collections.Counter(x) == collections.Counter(y)
@@ -60,10 +62,14 @@ class AtomType:
 class AccumulatedContact(object):
     """Contains information about a contact accumulated from AtomContact to display in GUI"""
 
+    # hbond count for every frame (SparseSeries), computed from contributingAtoms if not set
+    # class attribute, so that contacts from older session files still provide it
+    hbondFrameCounts = None
+
     def __init__(self, key1, key2):
         super(AccumulatedContact, self).__init__()
-        self.scoreArray = []  # score for every frame, summed by settings given in key1,key2
-        self.contributingAtoms = []  # list of list of AtomContacts, contributing to the contact
+        self.scoreArray = SparseSeries()  # score for every frame, summed by settings given in key1,key2
+        self.contributingAtoms = []  # AtomContacts contributing to the contact, per frame (cf. ContributingAtoms)
         self.key1 = key1  # list of properties of sel1, cf. AccumulationMapIndex
         self.key2 = key2  # list of properties of sel2, cf. AccumulationMapIndex
         # TODO:  human readable implementation of key/title
@@ -84,8 +90,23 @@ class AccumulatedContact(object):
         self.medianScore = 0
         self.contactType = 0
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # older session files store the series as lists
+        if not isinstance(self.scoreArray, SparseSeries):
+            self.scoreArray = SparseSeries.fromDense(self.scoreArray)
+        if self.hbondFrameCounts is not None and not isinstance(self.hbondFrameCounts, SparseSeries):
+            self.hbondFrameCounts = SparseSeries.fromDense(self.hbondFrameCounts, np.int64)
+
+    def view(self):
+        """Returns a copy sharing the score series and contributing atoms with this contact.
+
+            the series are never changed in place, a view replaces them to derive e.g. a frame range
+        """
+        return copy.copy(self)
+
     def getScoreArray(self):
-        return self.scoreArray
+        return self.scoreArray.tolist()
 
     def human_readable_title(self):
         """returns the title of the AccumulatedContact to be displayed in contact's label"""
@@ -154,19 +175,12 @@ class AccumulatedContact(object):
         """Computes the hbond percentage of all contacts, using the scoreArray."""
         self.hbondFramesScan()
         fnumber = len(self.scoreArray)
-        counter = 0
-        for element in self.hbondFrames:
-            if element > 0:
-                counter += 1
+        counter = self.hbondFrames.countAbove(0)
         return float(counter)/float(fnumber) * 100
 
     def total_time(self, ns_per_frame, threshold):
         """Returns the total time, the contact score is above the given threshold value."""
-        time = 0
-        for score in self.scoreArray:
-            if score > threshold:
-                time += ns_per_frame
-        self.ttime = time
+        self.ttime = self.scoreArray.countAbove(threshold) * ns_per_frame
         return self.ttime
 
     def mean_life_time(self, ns_per_frame, threshold):
@@ -181,49 +195,38 @@ class AccumulatedContact(object):
 
     def mean_score(self):
         """Returns the mean score of the scoreArray."""
-        mean = 0
-        for score in self.scoreArray:
-            mean += score
-        mean /= len(self.scoreArray)
+        mean = self.scoreArray.mean()
         self.meanScore = mean
         return mean
 
     def median_score(self):
         """Returns the median score of the scoreArray."""
-        med = np.median(self.scoreArray)
+        med = self.scoreArray.median()
         self.medianScore = med
         return med
 
     def life_time(self, ns_per_frame, threshold):
         """Computes the life time of a contact in ns, with the given threshold."""
-        lifeTimes = []
-        contactActive = False
-        contactTime = 0
-        i = 0
-        for score in self.scoreArray:
-            if contactActive is False and score > threshold:
-                contactActive = True
-                contactTime += ns_per_frame
-            elif contactActive is True and score > threshold:
-                contactTime += ns_per_frame
-            elif contactActive is True and score <= threshold:
-                contactActive = False
-                lifeTimes.append(contactTime)
-                contactTime = 0
-            if i == (len(self.scoreArray) - 1):
-                lifeTimes.append(contactTime)
-            i += 1
+        starts, lengths = self.scoreArray.runsAbove(threshold)
+        lifeTimes = (lengths * ns_per_frame).tolist()
+        # a contact that is not active in the last frame adds a zero life time
+        if len(self.scoreArray) > 0 and (len(starts) == 0 or starts[-1] + lengths[-1] != len(self.scoreArray)):
+            lifeTimes.append(0)
         return lifeTimes
 
     def hbondFramesScan(self):
-        self.hbondFrames = []
+        if self.hbondFrameCounts is not None:
+            self.hbondFrames = self.hbondFrameCounts
+            return self.hbondFrames
+        hbondFrames = []
         for frameList in self.contributingAtoms:
             currentFrame = 0
             for contAtoms in frameList:
                 length = len(contAtoms.hbondinfo)
                 if length > 0:
                     currentFrame += length
-            self.hbondFrames.append(currentFrame)
+            hbondFrames.append(currentFrame)
+        self.hbondFrames = SparseSeries.fromDense(hbondFrames, np.int64)
         return self.hbondFrames
 
     def setContactType(self):
@@ -255,11 +258,8 @@ class AccumulatedContact(object):
 
         # hydrogen bonds: donor, acceptor, both
         ishbond = 0
-        hb = self.hbondFramesScan()
-        for bla in hb:
-            if bla > 0:
-                ishbond = 1
-                break
+        if self.hbondFramesScan().countAbove(0) > 0:
+            ishbond = 1
 
         if self.atom1contactsBy == BackboneSidechainType.contactsSc \
                 and self.atom2contactsBy == BackboneSidechainType.contactsSc:
@@ -375,15 +375,9 @@ class BackboneSidechainContactType:
 
 def mean_score_of_contactArray(contacts):
     """Computes the mean score using the contacts array."""
-    meanList = []
-    for c in contacts:
-        meanList = np.concatenate((meanList, c.scoreArray), axis=0)
-    return np.mean(meanList)
+    return SparseSeries.concatenate([c.scoreArray for c in contacts]).mean()
 
 
 def median_score_of_contactArray(contacts):
     """Computes the mean score using the contacts array."""
-    medianList = []
-    for c in contacts:
-        medianList = np.concatenate((medianList, c.scoreArray), axis=0)
-    return np.median(medianList)
+    return SparseSeries.concatenate([c.scoreArray for c in contacts]).median()
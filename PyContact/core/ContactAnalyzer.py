@@ -1,25 +1,33 @@
 from __future__ import print_function
-import itertools
-import re
+import atexit
 import os
+import shutil
+import tempfile
 import time
 import multiprocessing
 from multi_accumulation import *
-from multi_trajectory import run_load_parallel
+from multi_trajectory import run_load_parallel, scan_trajectory, frame_indices, topology_token
 from LogPool import *
-from copy import deepcopy
 
 import pickle
 
 import MDAnalysis
-from MDAnalysis.analysis import distances
 import numpy as np
 from PyQt5.QtCore import pyqtSlot, pyqtSignal, QObject
 
 # TODO: fix aroundPatch with gridsearch in C code using cython
 from .aroundPatch import AroundSelection
-
-from .Biochemistry import (AccumulatedContact, AtomContact, AccumulationMapIndex, AtomType, HydrogenBond, AtomHBondType, TempContactAccumulate, HydrogenBondAtoms)
+from .Topology import Topology
+from .hbond_search import candidate_envelope
+from .ScanCache import ScanCache
+from .ContactStore import ContactStore, accepted_hbonds, shared_memory_dir
+from .frame_scheduler import frame_blocks, run_frame_blocks
+from .ProgressChannel import progressChannel
+from .ScoreMatrix import ScoreMatrix
+from .SparseSeries import SparseSeries
+from .ContributingAtoms import ContributingAtoms
+
+from .Biochemistry import (AccumulatedContact, AtomContact, AccumulationMapIndex, AtomType, HydrogenBond, AtomHBondType, HydrogenBondAtoms)
 
 MDAnalysis.core.flags['use_periodic_selections'] = False
 MDAnalysis.core.flags['use_KDTree_routines'] = True
@@ -29,7 +37,8 @@ class Analyzer(QObject):
     """Performs a contact search and analyzes the results."""
     frameUpdate = pyqtSignal(float)
 
-    def __init__(self, psf, dcd, cutoff, hbondcutoff, hbondcutangle, sel1text, sel2text):
+    def __init__(self, psf, dcd, cutoff, hbondcutoff, hbondcutangle, sel1text, sel2text, start=None, stop=None,
+                 step=None):
         super(Analyzer, self).__init__()
         self.psf = psf
         self.dcd = dcd
@@ -38,35 +47,81 @@ class Analyzer(QObject):
         self.hbondcutangle = hbondcutangle
         self.sel1text = sel1text
         self.sel2text = sel2text
+        # only the frames start:stop:step of the trajectory are read
+        self.start = start
+        self.stop = stop
+        self.step = step
         self.lastMap1 = []
         self.lastMap2 = []
-        self.contactResults = []
-        self.contactResults = []
+        # (generation, directory) of the contactResults tables shared with the workers, cf. sharedContactResults
+        self.sharedContacts = None
+        self.contactResults = ContactStore()
         self.resname_array = []
         self.resid_array = []
         self.name_array = []
         self.segids = []
         self.backbone = []
         self.finalAccumulatedContacts = []
-        self.bonds = []
         self.totalFrameNumber = 0
         self.currentFrameNumber = 0
-        self.analysis_state = False
-        self.totalFramesToProcess = 1
-
-    def runFrameScan(self, nproc):
-        """Performs a contact search using nproc threads."""
+        # worker processes are started on first use and kept for subsequent scans/analyses
+        self.workerPool = WorkerPool()
+        # ScanCache, frame scans with identical input files and parameters are read from it if set
+        self.scanCache = None
+        # whether the last frame scan was read from scanCache
+        self.scanCached = False
+
+    @property
+    def contactResults(self):
+        return self._contactResults
+
+    @contactResults.setter
+    def contactResults(self, store):
+        # the tables shared for the previous store are not needed anymore
+        self._contactResults = store
+        self.releaseSharedContacts()
+
+    def runFrameScan(self, nproc, threads=False):
+        """Performs a contact search using nproc processes, or nproc threads within this process if threads is set.
+
+            the results are read from/added to self.scanCache if set
+        """
         try:
-            if nproc == 1:
+            cacheKey = None
+            self.scanCached = False
+            if self.scanCache is not None:
+                # scans with different hbond criteria share the recorded hbond candidates
+                envelope = candidate_envelope(self.hbondcutoff, self.hbondcutangle)
+                cacheKey = self.scanCache.key(self.psf, self.dcd, self.cutoff, envelope[0], envelope[1],
+                                              self.sel1text, self.sel2text, self.start, self.stop, self.step)
+                cached = self.scanCache.get(cacheKey)
+                if cached is not None:
+                    self.scanCached = True
+                    self.contactResults = cached.withHbondCriteria(self.hbondcutoff, self.hbondcutangle)
+                    self.loadTopology()
+                    return
+            if nproc == 1 or threads:
                 self.contactResults = self.analyze_psf_dcd(self.psf, self.dcd, self.cutoff, self.hbondcutoff,
-                                                       self.hbondcutangle, self.sel1text, self.sel2text)
+                                                           self.hbondcutangle, self.sel1text, self.sel2text,
+                                                           self.start, self.stop, self.step, nproc)
             else:
                 self.contactResults, self.resname_array, self.resid_array, self.name_array, self.segids, \
                             self.backbone = run_load_parallel(nproc, self.psf, self.dcd, self.cutoff, self.hbondcutoff,
-                                                              self.hbondcutangle, self.sel1text, self.sel2text)
+                                                              self.hbondcutangle, self.sel1text, self.sel2text,
+                                                              self.start, self.stop, self.step, self.workerPool,
+                                                              self.frameUpdate.emit)
+            if cacheKey is not None:
+                self.scanCache.put(cacheKey, self.contactResults)
         except:
             raise Exception
 
+    def loadTopology(self):
+        """Sets the per-atom arrays from the topology, without scanning the trajectory."""
+        u = MDAnalysis.Universe(self.psf, self.dcd)
+        topology = Topology.load(self.psf, u)
+        self.resname_array, self.resid_array, self.name_array, self.segids, self.backbone = topology.trajectoryData()
+        self.totalFrameNumber = len(self.contactResults)
+
     def runContactAnalysis(self, map1, map2, nproc):
         """Performs a contadt analysis using nproc threads."""
         if nproc == 1:
@@ -76,7 +131,108 @@ class Analyzer(QObject):
 
         self.lastMap1 = map1
         self.lastMap2 = map2
-        return deepcopy(self.finalAccumulatedContacts)
+        # views share the series and atoms with finalAccumulatedContacts, nothing is copied
+        return [c.view() for c in self.finalAccumulatedContacts]
+
+    def iterFrameScan(self):
+        """Scans the trajectory frame by frame, yields the (contacts, hbond candidates) arrays of each frame.
+
+            The frames are not kept, cf. ContactStore.fromFrames for the array layout.
+        """
+        return self.scan_psf_dcd(self.psf, self.dcd, self.cutoff, self.hbondcutoff, self.hbondcutangle,
+                                 self.sel1text, self.sel2text, self.start, self.stop, self.step)
+
+    def runStreamingAnalysis(self, map1, map2):
+        """Performs frame scan and contact accumulation in a single pass with bounded memory.
+
+            every frame is accumulated with map1/map2 right after it has been scanned,
+            only the per-key score series are kept: contactResults stays empty and the
+            AccumulatedContacts carry hbond counts per frame instead of their contributing atoms.
+        """
+        self.contactResults = ContactStore()
+        # key -> [key1, key2, frames, scores, hbond counts, bb1, bb2, sc1, sc2], only frames with the key are kept
+        series = {}
+        framesDone = 0
+        groups1 = groups2 = isBackbone = None
+        progressChannel.reset(0, self.frameUpdate.emit)
+        for contacts, candidates in self.iterFrameScan():
+            if groups1 is None:
+                # the topology arrays are available once the scan has started
+                groups1 = group_ids(self.getTrajectoryData(), map1)
+                groups2 = group_ids(self.getTrajectoryData(), map2)
+                isBackbone = backbone_mask(self.getTrajectoryData())
+            hbonds = candidates[accepted_hbonds(candidates, self.hbondcutoff, self.hbondcutangle)]
+            hbondCounts = np.bincount(hbonds["contact"], minlength=len(contacts))
+            contactKeys = contact_keys(contacts["idx1"], contacts["idx2"], groups1, groups2)
+            # scores of the frame per key, the backbone/sidechain scores are masked sums
+            frameKeys, keyIndex = np.unique(contactKeys, return_inverse=True)
+            weights = contacts["weight"]
+            frameScores = [np.bincount(keyIndex, weights=w, minlength=len(frameKeys)).tolist()
+                           for w in [weights, hbondCounts,
+                                     weights * isBackbone[contacts["idx1"]], weights * isBackbone[contacts["idx2"]],
+                                     weights * ~isBackbone[contacts["idx1"]], weights * ~isBackbone[contacts["idx2"]]]]
+            for key, score, hbondCount, bb1, bb2, sc1, sc2 in zip(frameKeys.tolist(), *frameScores):
+                if key not in series:
+                    key1, key2 = key_arrays(key, self.getTrajectoryData(), map1, map2, groups1, groups2)
+                    series[key] = [key1, key2, [], [], [], 0, 0, 0, 0]
+                entry = series[key]
+                entry[2].append(framesDone)
+                entry[3].append(score)
+                entry[4].append(int(hbondCount))
+                entry[5] += bb1
+                entry[6] += bb2
+                entry[7] += sc1
+                entry[8] += sc2
+            framesDone += 1
+            # the number of frames is known once the scan has started
+            progressChannel.total = self.totalFrameNumber
+            progressChannel.frameDone()
+            progressChannel.poll()
+        progressChannel.poll(True)
+
+        finalAccumulatedContacts = []
+        for key in series:
+            key1, key2, frames, scores, hbondCounts, bb1, bb2, sc1, sc2 = series[key]
+            acc = AccumulatedContact(key1, key2)
+            frames = np.array(frames, dtype=np.int64)
+            acc.scoreArray = SparseSeries(framesDone, frames, np.array(scores, dtype=np.float64))
+            acc.hbondFrameCounts = SparseSeries(framesDone, frames, np.array(hbondCounts, dtype=np.int64))
+            acc.contributingAtoms = ContributingAtoms(self.contactResults, frames[:0], 0, framesDone)
+            acc.bb1, acc.bb2, acc.sc1, acc.sc2 = bb1, bb2, sc1, sc2
+            finalAccumulatedContacts.append(acc)
+        self.finalAccumulatedContacts = finalAccumulatedContacts
+        self.lastMap1 = map1
+        self.lastMap2 = map2
+        return self.finalAccumulatedContacts
+
+    def withCutoff(self, cutoff):
+        """Returns an Analyzer with the frame scan results for cutoff, derived from the stored contacts.
+
+            cutoff must not exceed self.cutoff, a cutoff sweep requires a single frame scan only
+        """
+        if cutoff > self.cutoff:
+            raise ValueError("cutoff %s exceeds the scanned cutoff %s" % (cutoff, self.cutoff))
+        return self.derivedAnalyzer(cutoff, self.hbondcutoff, self.hbondcutangle,
+                                    self.contactResults.withinCutoff(cutoff))
+
+    def withHbondCriteria(self, hbondcutoff, hbondcutangle):
+        """Returns an Analyzer with the hydrogen bonds re-evaluated for new criteria, without rescanning.
+
+            the criteria have to be within the envelope of the recorded hbond candidates (cf. candidate_envelope)
+        """
+        return self.derivedAnalyzer(self.cutoff, hbondcutoff, hbondcutangle,
+                                    self.contactResults.withHbondCriteria(hbondcutoff, hbondcutangle))
+
+    def derivedAnalyzer(self, cutoff, hbondcutoff, hbondcutangle, contactResults):
+        """Returns an Analyzer for the same trajectory and selections with the given parameters and results."""
+        derived = Analyzer(self.psf, self.dcd, cutoff, hbondcutoff, hbondcutangle, self.sel1text,
+                           self.sel2text, self.start, self.stop, self.step)
+        derived.setTrajectoryData(*self.getTrajectoryData())
+        derived.contactResults = contactResults
+        derived.totalFrameNumber = len(derived.contactResults)
+        derived.workerPool = self.workerPool
+        derived.scanCache = self.scanCache
+        return derived
 
     def setTrajectoryData(
             self, resname_array, resid_array, name_array,
@@ -98,363 +254,41 @@ class Analyzer(QObject):
     def getFilePaths(self):
         return self.psf, self.dcd
 
-    # find a string in s between the strings first and last
-    @staticmethod
-    def find_between(s, first, last):
-        try:
-            start = s.index(first) + len(first)
-            end = s.index(last, start)
-            return s[start:end]
-        except ValueError:
-            return ""
+    def getFrameRange(self):
+        return self.start, self.stop, self.step
 
     @staticmethod
     def weight_function(value):
         """weight function to score contact distances"""
         return 1.0 / (1.0 + np.exp(5.0 * (value - 4.0)))
 
-    def makeKeyArraysFromMaps(self, map1, map2, contact):
-        """Creates key Arrays from the chosen accumulation maps.
-
-            maps contain information wether to consider an atom's field for contact accumulation
-            map1 and map2 contain six boolean values each, cf. AccumulationMapIndex
-            for a given contact, the corresponding value to a field is written to keys1 and keys2, respectively
-            example input:
-            map1 = [0,0,0,1,1,0]
-            map2 = [0,0,0,1,1,0], meaning that residue and resname should be used for contact accumulation
-            contact: idx1,idx2
-            results: (example!)
-            keys1=["none","none","none","14", "VAL", "none"]
-            keys2=["none","none","none","22", "ILE, "none"]
-
-        """
-        idx1 = contact.idx1
-        idx2 = contact.idx2
-        counter = 0
-        keys1 = []
-        for val in map1:
-            if val == 1:
-                if counter == AccumulationMapIndex.index:
-                    keys1.append(idx1)
-                elif counter == AccumulationMapIndex.name:
-                    keys1.append(self.name_array[idx1])
-                elif counter == AccumulationMapIndex.resid:
-                    keys1.append(self.resid_array[idx1])
-                elif counter == AccumulationMapIndex.resname:
-                    keys1.append(self.resname_array[idx1])
-                elif counter == AccumulationMapIndex.segid:
-                    keys1.append(self.segids[idx1])
-            else:
-                keys1.append("none")
-            counter += 1
-        counter = 0
-        keys2 = []
-        for val in map2:
-            if val == 1:
-                if counter == AccumulationMapIndex.index:
-                    keys2.append(idx2)
-                elif counter == AccumulationMapIndex.name:
-                    keys2.append(self.name_array[idx2])
-                elif counter == AccumulationMapIndex.resid:
-                    keys2.append(self.resid_array[idx2])
-                elif counter == AccumulationMapIndex.resname:
-                    keys2.append(self.resname_array[idx2])
-                elif counter == AccumulationMapIndex.segid:
-                    keys2.append(self.segids[idx2])
-            else:
-                keys2.append("none")
-            counter += 1
-        return [keys1, keys2]
-
-    def makeKeyArraysFromKey(self, key):
-        """Converts a key to two key arrays.
-            "inverse" function of makeKeyFromKeyArrays
-        """
-        keystring1, keystring2 = key.split("-")
-        mapping = AccumulationMapIndex.mapping
-        maximal = len(mapping)
-        key1 = []
-        for i in range(0, maximal):
-            current = mapping[i]
-            if current not in keystring1:
-                key1.append("none")
-                continue
-            if i == (maximal - 1):
-                key1.append(keystring1[keystring1.index(current) + len(current):])
-                break
-            nextCurrent = mapping[i + 1]
-            if nextCurrent not in keystring1:
-                nxt = ""
-                for k in mapping[i + 1:]:
-                    if k in keystring1[keystring1.index(current) + len(current):]:
-                        nxt = k
-                        break
-                if nxt != "":
-                    key1.append(keystring1[keystring1.index(current) + len(current):keystring1.index(nxt)])
-                else:
-                    key1.append(keystring1[keystring1.index(current) + len(current):])
-                continue
-            else:
-                currentValue = self.find_between(keystring1, current, nextCurrent)
-                if currentValue == "":
-                    key1.append("none")
-                else:
-                    key1.append(currentValue)
-
-        key2 = []
-        for i in range(0, maximal):
-            current = mapping[i]
-            if current not in keystring2:
-                key2.append("none")
-                continue
-            if i == (maximal - 1):
-                key2.append(keystring2[keystring2.index(current) + len(current):])
-                break
-            nextCurrent = mapping[i + 1]
-            if nextCurrent not in keystring2:
-                nxt = ""
-                for k in mapping[i + 1:]:
-                    if k in keystring2[keystring2.index(current) + len(current):]:
-                        nxt = k
-                        break
-                if nxt != "":
-                    key2.append(keystring2[keystring2.index(current) + len(current):keystring2.index(nxt)])
-                else:
-                    key2.append(keystring2[keystring2.index(current) + len(current):])
-                continue
-            else:
-                currentValue = self.find_between(keystring2, current, nextCurrent)
-                if currentValue == "":
-                    key2.append("none")
-                else:
-                    key2.append(currentValue)
-        return [key1, key2]
-
-    @staticmethod
-    def makeKeyFromKeyArrays(key1, key2):
-        """Returns a human readable key from two key arrays.
-            example:
-            keys1=["none","none","14", "VAL", "none"]
-            keys2=["none","none","22", "ILE", "none"]
-            returns a human readable key with the mapping identifiers in AccumulationMapIndex
-            in the given example data:
-            key="r.14rn.VAL-r.22rn.ILE"
-            key is used to accumulated contacts in a dictionary (= a contact's unique identifier)
-        """
-        key = ""
-        itemcounter = 0
-        for item in key1:
-            if item != "none":
-                key += AccumulationMapIndex.mapping[itemcounter] + str(item)
-            itemcounter += 1
-        key += "-"
-        itemcounter = 0
-        for item in key2:
-            if item != "none":
-                key += AccumulationMapIndex.mapping[itemcounter] + str(item)
-            itemcounter += 1
-        return key
-
-    def analyze_psf_dcd(self, psf, dcd, cutoff, hbondcutoff, hbondcutangle, sel1text, sel2text):
+    def analyze_psf_dcd(self, psf, dcd, cutoff, hbondcutoff, hbondcutangle, sel1text, sel2text, start=None,
+                        stop=None, step=None, nthreads=1):
         """Reading topology/trajectory and assessing hbonds"""
+        contactResults = list(self.scan_psf_dcd(psf, dcd, cutoff, hbondcutoff, hbondcutangle, sel1text, sel2text,
+                                                start, stop, step, nthreads))
+        return ContactStore.fromFrames(contactResults, hbondcutoff, hbondcutangle,
+                                       candidate_envelope(hbondcutoff, hbondcutangle))
+
+    def scan_psf_dcd(self, psf, dcd, cutoff, hbondcutoff, hbondcutangle, sel1text, sel2text, start=None, stop=None,
+                     step=None, nthreads=1):
+        """Generator, yields the (contacts, hbond candidates) arrays of every frame in start:stop:step
+            as soon as it has been scanned, frames are scanned by nthreads threads."""
 
         # load psf and dcd file in memory
         u = MDAnalysis.Universe(psf, dcd)
 
-# TODO: think about doing u.select_atoms(sel1text + " or " + sel2text)
-        all_sel = u.select_atoms("all")
-        # all_sel = u.select_atoms("%s or %s or name H.*" % (sel1text, sel2text))
-        backbone_sel = u.select_atoms("backbone")
-        self.resname_array = []
-        self.resid_array = []
-        self.name_array = []
-        self.segids = []
-        self.backbone = []
-        for atom in all_sel.atoms:
-            self.resname_array.append(atom.resname)
-            self.resid_array.append(atom.resid)
-            self.name_array.append(atom.name)
-            self.bonds.append(atom.bonds)
-            self.segids.append(atom.segid)
-        for atom in backbone_sel:
-            self.backbone.append(atom.index)
-
-
-        # check if self-interaction is wanted
-        selfInteraction = False
-
-        if sel2text == "self":
-            sel1 = u.select_atoms(sel1text)
-            sel2 = u.select_atoms(sel1text)
-            selfInteraction = True
-        else:
-            sel1 = u.select_atoms(sel1text)
-            sel2 = u.select_atoms(sel2text)
-
-        if (len(sel1.atoms) == 0 or len(sel2.atoms) == 0):
-            raise Exception
+        # properties of all atoms as arrays, cached for the topology file
+        topology = Topology.load(psf, u)
+        self.resname_array, self.resid_array, self.name_array, self.segids, self.backbone = topology.trajectoryData()
+        hbondTopology = topology.hbondTopology()
 
-        contactResults = []
         # loop over trajectory
-        self.totalFrameNumber = len(u.trajectory)
-        start = time.time()
-        for ts in u.trajectory:
-            # define selections according to sel1text and sel2text
-            if "around" in sel1text:
-                sel1 = u.select_atoms(sel1text)
-            if "around" in sel2text:
-                sel2 = u.select_atoms(sel2text)
-            # write atomindices for each selection to list
-            indices1 = []
-            for at in sel1.atoms:
-                indices1.append(at.index)
-            indices2 = []
-            for at in sel2.atoms:
-                indices2.append(at.index)
-
-            currentFrameContacts = []
-            frame = ts.frame
-            self.currentFrameNumber = ts.frame
-            # print(frame)
-            result = np.ndarray(shape=(len(sel1.positions), len(sel2.positions)), dtype=float)
-            # distarray is the distance matrix between all atoms in sel1 and sel2
-            # row = sel1, column = sel2
-            distarray = distances.distance_array(sel1.positions, sel2.positions, box=None, result=result)
-            contacts = np.where(distarray <= cutoff)
-            # idx1 and idx2 correspond to a row,column in contacts, respectively
-            # they do NOT correspond to a global atom index!
-            for idx1, idx2 in itertools.izip(contacts[0], contacts[1]):
-                convindex1 = indices1[idx1]  # idx1 converted to global atom indexing
-                convindex2 = indices2[idx2]  # idx2 converted to global atom indexing
-                # jump out of loop if hydrogen contacts are found, only contacts between heavy atoms are considered,
-                # hydrogen bonds can still be detected!
-                if re.match("H(.*)", self.name_array[convindex1]) or re.match("H(.*)", self.name_array[convindex2]):
-                    continue
-                    # distance between atom1 and atom2
-                # check if residues are more than 4 apart, and in the same segment
-                if selfInteraction:
-                    if (self.resid_array[convindex1] - self.resid_array[convindex2]) < 5 and self.segids[convindex1] == self.segids[convindex2]:
-                        continue
-                distance = distarray[idx1, idx2]
-                weight = self.weight_function(distance)
-
-                # HydrogenBondAlgorithm
-                hydrogenBonds = []
-                # FF independent hydrogen bonds
-                if (self.name_array[convindex1][0] in HydrogenBondAtoms.atoms and self.name_array[convindex2][0] in HydrogenBondAtoms.atoms):
-                        # print("hbond? %s - %s" % (type_array[convindex1], type_array[convindex2]))
-                        # search for hatom, check numbering in bond!!!!!!!!!!
-                        b1 = self.bonds[convindex1]
-                        b2 = self.bonds[convindex2]
-
-                        # b1 = all_sel[convindex1].bonds
-                        # b2 = all_sel[convindex2].bonds
-                        # search for hydrogen atoms bound to atom 1
-                        bondcount1 = 0
-                        hydrogenAtomsBoundToAtom1 = []
-
-                        # new code
-                        for bnd in b1:
-                            b = bnd.type
-                            hydrogen = next((x for x in b if x.startswith("H")), 0)
-                            # print(b)
-                            if hydrogen != 0:
-                                # print("h bond to atom1")
-                                bondindices1 = b1.to_indices()[bondcount1]
-                                # print bondindices1
-                                # for j in bondindices1:
-                                #     print(self.type_array[j+1])
-                                hydrogenidx = next(
-                                    (j for j in bondindices1 if self.name_array[j].startswith("H")), -1)
-                                if hydrogenidx != -1:
-                                    # print(self.type_array[hydrogenidx])
-                                    hydrogenAtomsBoundToAtom1.append(hydrogenidx)
-                            bondcount1 += 1
-                        # search for hydrogen atoms bound to atom 2
-                        bondcount2 = 0
-                        hydrogenAtomsBoundToAtom2 = []
-                        # print(b2)
-                        for bnd2 in b2:
-                            b = bnd2.type
-                            hydrogen = next((x for x in b if x.startswith("H")), 0)
-                            # print(b)
-                            if hydrogen != 0:
-                                # print("h bond to atom2")
-                                bondindices2 = b2.to_indices()[bondcount2]
-                                hydrogenidx = next(
-                                    (k for k in bondindices2 if self.name_array[k].startswith("H")), -1)
-                                if hydrogenidx != -1:
-                                    # print(type_array[hydrogenidx])
-                                    hydrogenAtomsBoundToAtom2.append(hydrogenidx)
-                            bondcount2 += 1
-                        # check hbond criteria for hydrogen atoms bound to first atom
-                        for global_hatom in hydrogenAtomsBoundToAtom1:
-                            conv_hatom = indices1.index(global_hatom)
-                            # print(typeHeavy)
-                            #
-                            # TODO: FF independent version
-                            # if (typeHeavy == AtomHBondType.acc or typeHeavy == AtomHBondType.both) and (distarray[conv_hatom, idx2] <= hbondcutoff):
-                            dist = distarray[conv_hatom, idx2]
-                            if (dist <= hbondcutoff):
-                                donorPosition = sel1.positions[idx1]
-                                hydrogenPosition = sel1.positions[conv_hatom]
-                                acceptorPosition = sel2.positions[idx2]
-                                v1 = hydrogenPosition - acceptorPosition
-                                v2 = hydrogenPosition - donorPosition
-                                v1norm = np.linalg.norm(v1)
-                                v2norm = np.linalg.norm(v2)
-                                dot = np.dot(v1, v2)
-                                angle = np.degrees(np.arccos(dot / (v1norm * v2norm)))
-                                # print(angle)
-                                if angle >= hbondcutangle:
-                                    # print("new hbond")
-                                    new_hbond = HydrogenBond(convindex1, convindex2, global_hatom, dist, angle,
-                                                             hbondcutoff,
-                                                             hbondcutangle)
-                                    hydrogenBonds.append(new_hbond)
-                                    # print(str(convindex1) + " " + str(convindex2)
-                                    # print("hbond found: %d,%d,%d"%(convindex1,global_hatom,convindex2))
-                                    # print(angle)
-                        for global_hatom in hydrogenAtomsBoundToAtom2:
-                            conv_hatom = indices2.index(global_hatom)
-                            # TODO: FF independent version
-                            # if (typeHeavy == AtomHBondType.acc or typeHeavy == AtomHBondType.both) and (distarray[idx1, conv_hatom] <= hbondcutoff):
-                            # FIXME: WTF?
-                            # if (distarray[conv_hatom, idx2] <= hbondcutoff):
-                            dist = distarray[idx1, conv_hatom]
-                            if (dist <= hbondcutoff):
-                                donorPosition = sel2.positions[idx2]
-                                hydrogenPosition = sel2.positions[conv_hatom]
-                                acceptorPosition = sel1.positions[idx1]
-                                v1 = hydrogenPosition - acceptorPosition
-                                v2 = hydrogenPosition - donorPosition
-                                v1norm = np.linalg.norm(v1)
-                                v2norm = np.linalg.norm(v2)
-                                dot = np.dot(v1, v2)
-                                angle = np.degrees(np.arccos(dot / (v1norm * v2norm)))
-                                if angle >= hbondcutangle:
-                                    new_hbond = HydrogenBond(convindex2, convindex1, global_hatom, dist, angle,
-                                                             hbondcutoff,
-                                                             hbondcutangle)
-                                    hydrogenBonds.append(new_hbond)
-                                    # print str(convindex1) + " " + str(convindex2)
-                                    # print "hbond found: %d,%d,%d"%(convindex2,global_hatom,convindex1)
-                                    # print angle
-                                    # finalize
-                newAtomContact = AtomContact(int(frame), float(distance), float(weight), int(convindex1),
-                                             int(convindex2),
-                                             hydrogenBonds)
-                currentFrameContacts.append(newAtomContact)
-            contactResults.append(currentFrameContacts)
-        stop = time.time()
-
-        # show trajectory information and selection information
-        #print("trajectory with %d frames loaded" % len(u.trajectory))
-        #print("Selection 1: ", len(sel1.positions), ", Selection2: ", len(sel2.positions))
-
-        #print("analyzeTime: ", stop - start)
-        # pickle.dump(contactResults, open("single_results.dat", "w"))
-        return contactResults
+        self.totalFrameNumber = len(frame_indices(len(u.trajectory), start, stop, step))
+        frames = scan_trajectory(u, sel1text, sel2text, start, stop, step, [cutoff, hbondcutoff, hbondcutangle],
+                                 hbondTopology, self.resid_array, self.segids, nthreads)
+        for self.currentFrameNumber, frame in enumerate(frames):
+            yield frame
 
     def analyze_contactResultsWithMaps(self, contactResults, map1, map2):
         """Analyzes contactsResults with the given maps."""
@@ -467,164 +301,121 @@ class Analyzer(QObject):
         #################################################
 
         # Data structure to process:
-        # contactResults (list of frames)
-        # ---> frame (list of AtomContacts)
-        # --------> AtomContact
-
-        frame_contacts_accumulated = []
-        # frame_contacts_accumulated (list of frames)
-        # ---> frame_dict (dict)
-        # --------> key vs. TempContactAccumulate
-
-        # list of all contacts keys (= unique identifiers, determined by the given maps)
-        start = time.time()
-        allkeys = []
-        total = len(contactResults)
-        counter = 1
-        for frame in contactResults:
-            currentFrameAcc = {}
-            for cont in frame:
-                key1, key2 = self.makeKeyArraysFromMaps(map1, map2, cont)
-                key = self.makeKeyFromKeyArrays(key1, key2)
-                if key in currentFrameAcc:
-                    currentFrameAcc[key].fscore += cont.weight
-                    currentFrameAcc[key].contributingAtomContacts.append(cont)
-                    if cont.idx1 in self.backbone:
-                        currentFrameAcc[key].bb1score += cont.weight
-                    else:
-                        currentFrameAcc[key].sc1score += cont.weight
-                    if cont.idx2 in self.backbone:
-                        currentFrameAcc[key].bb2score += cont.weight
-                    else:
-                        currentFrameAcc[key].sc2score += cont.weight
-                else:
-                    currentFrameAcc[key] = TempContactAccumulate(key1, key2)
-                    currentFrameAcc[key].fscore += cont.weight
-                    currentFrameAcc[key].contributingAtomContacts.append(cont)
-                    if cont.idx1 in self.backbone:
-                        currentFrameAcc[key].bb1score += cont.weight
-                    else:
-                        currentFrameAcc[key].sc1score += cont.weight
-                    if cont.idx2 in self.backbone:
-                        currentFrameAcc[key].bb2score += cont.weight
-                    else:
-                        currentFrameAcc[key].sc2score += cont.weight
-                if key not in allkeys:
-                    allkeys.append(key)
-            frame_contacts_accumulated.append(currentFrameAcc)
-            self.frameUpdate.emit(float(counter) / float(total))
-            counter += 1
-        accumulatedContactsDict = {}
-        stop = time.time()
-        # print(stop - start)
-        # accumulatedContactsDict (dict)
-        # ---> key vs. list of TempContactAccumulated
-        #
-        # loop fills gaps with zero-score TempContactAccumulate of key if key is not occuring in a frame
-        # provides clean data!
-        start = time.time()
-        for key in allkeys:
-            accumulatedContactsDict[key] = []
-            for frame_dict in frame_contacts_accumulated:
-                if key not in frame_dict:  # puts empty score TempContactAccumulate in dict
-                    key1, key2 = self.makeKeyArraysFromKey(key)
-                    emptyCont = TempContactAccumulate(key1, key2)
-                    emptyCont.fscore = 0
-                    frame_dict[key] = emptyCont
-                accumulatedContactsDict[key].append(frame_dict[key])
-
-                # make a list of AccumulatedContacts from accumulatedContactsDict
-        # probably, there is a much easier way to do that, but I am too tired at the moment and it works, though... (M)
-        finalAccumulatedContacts = []  # list of AccumulatedContacts
-        for key in accumulatedContactsDict:
-            key1, key2 = self.makeKeyArraysFromKey(key)
-            acc = AccumulatedContact(key1, key2)
-            for tempContact in accumulatedContactsDict[key]:
-                acc.addScore(tempContact.fscore)
-                acc.addContributingAtoms(tempContact.contributingAtomContacts)
-                acc.bb1 += tempContact.bb1score
-                acc.bb2 += tempContact.bb2score
-                acc.sc1 += tempContact.sc1score
-                acc.sc2 += tempContact.sc2score
-            finalAccumulatedContacts.append(acc)
-            # print(key, acc.bb1, acc.bb2, acc.sc1, acc.sc2)
-            # print(len(acc.scoreArray))
-        stop = time.time()
-        # print(stop - start)
-        return finalAccumulatedContacts
-
-    def analysisEventListener(self):
-        """Event listener for the progress bar in MainWindow."""
-        while self.analysis_state:
-            progress = 0
-            for each in analysisProgressDict.keys():
-                progress += analysisProgressDict[each]
-            progress = float(progress) / float(self.totalFramesToProcess)
-            if progress > 0:
-                self.frameUpdate.emit(progress)
-
-            if progress == 1.0:
-                for each in analysisProgressDict.keys():
-                    analysisProgressDict[each] = 0
-                progress = 0
-                self.analysis_state = False
+        # contactResults (ContactStore, contact rows of all frames)
+        # ---> ScoreMatrix (keys x frames), one row per contact key (= unique identifier, determined by the maps)
+        # --------> AccumulatedContact, a view onto one row
+        matrix, contactKeys, groups1, groups2 = self.scoreMatrixWithMaps(contactResults, map1, map2)
+        return self.accumulatedContacts(contactResults, matrix, contactKeys, map1, map2, groups1, groups2)
 
     def analyze_contactResultsWithMaps_Parallel(self, map1, map2, nproc):
         """Analyzes contactsResults with the given maps, using nproc threads."""
-        start = time.time()
-        self.totalFramesToProcess = len(self.contactResults)
+        matrix, contactKeys, groups1, groups2 = self.scoreMatrixWithMaps_Parallel(map1, map2, nproc)
+        return self.accumulatedContacts(self.contactResults, matrix, contactKeys, map1, map2, groups1, groups2)
+
+    def runMultiContactAnalysis(self, mapPairs, nproc):
+        """Performs the contact analysis for every (map1, map2) pair of mapPairs in a single pass.
+
+            The contacts are accumulated once with the finest maps, which select every property selected by
+            any of the maps, the results of all pairs are rolled up from this ScoreMatrix.
+            Returns the list of AccumulatedContacts of every pair, finalAccumulatedContacts is not changed.
+        """
+        finest1, finest2 = finest_map([m[0] for m in mapPairs]), finest_map([m[1] for m in mapPairs])
+        if nproc == 1:
+            finest = self.scoreMatrixWithMaps(self.contactResults, finest1, finest2)
+        else:
+            finest = self.scoreMatrixWithMaps_Parallel(finest1, finest2, nproc)
+        matrix, contactKeys, groups1, groups2 = finest
+        trajectoryData = self.getTrajectoryData()
         results = []
-        rank = 0
-        manager = multiprocessing.Manager()
-        d = manager.list(self.getTrajectoryData())
-        all_chunk = chunks(self.contactResults, nproc)
-        pool = LoggingPool(nproc)
+        for map1, map2 in mapPairs:
+            coarse1, coarse2 = group_ids(trajectoryData, map1), group_ids(trajectoryData, map2)
+            rowKeys = rolled_up_keys(matrix.keys, groups1, groups2, coarse1, coarse2)
+            coarseMatrix = matrix.rollUp(rowKeys)
+            coarseKeys = rowKeys[matrix.rowsOf(contactKeys)]
+            results.append(self.accumulatedContacts(self.contactResults, coarseMatrix, coarseKeys, map1, map2,
+                                                    coarse1, coarse2))
+        return results
+
+    def scoreMatrixWithMaps(self, contactResults, map1, map2):
+        """Returns the ScoreMatrix of contactResults, the integer key of every contact and the group ids of both maps."""
+        progressChannel.reset(len(contactResults), self.frameUpdate.emit)
+        # integer key of every atom contact, atoms are grouped according to the maps
+        trajectoryData = self.getTrajectoryData()
+        groups1, groups2 = group_ids(trajectoryData, map1), group_ids(trajectoryData, map2)
+        contactKeys = contact_keys(contactResults.contacts["idx1"], contactResults.contacts["idx2"], groups1, groups2)
+        matrix = ScoreMatrix.fromStore(contactResults, contactKeys, backbone_mask(trajectoryData))
+        progressChannel.frameDone(len(contactResults))
+        progressChannel.poll(True)
+        return matrix, contactKeys, groups1, groups2
+
+    def scoreMatrixWithMaps_Parallel(self, map1, map2, nproc):
+        """Same as scoreMatrixWithMaps for contactResults, using nproc threads."""
+        # small blocks of frames are handed to the workers on demand
+        blocks = frame_blocks(range(len(self.contactResults)), nproc)
+        # the topology arrays stay resident in the workers, the contact tables are shared memory maps,
+        # only the frame ranges of the blocks are sent
+        pool = self.workerPool.get(nproc, topology=(topology_token(self.psf), self.getTrajectoryData()[0:5]))
+        directory = self.sharedContactResults()
         print("Running on %d cores" % nproc)
-        for c in all_chunk:
-            results.append(pool.apply_async(loop_frame, args=(c, map1, map2, d, rank)))
-            rank += 1
-        # self.totalFramesToProcess = len(contResults)
-        self.analysis_state = True
-        self.analysisEventListener()
-        pool.close()
-        pool.join()
-        self.analysis_state = False
-        stop = time.time()
-        # print("time: ", str(stop - start), rank)
-        # print(str(len(c)), rank)
-        allkeys = []
-        frame_contacts_accumulated = []
-        # print(len(results))
-        for res in results:
-            rn = res.get()
-            allkeys.extend(rn[0])
-            frame_contacts_accumulated.extend(rn[1])
-        accumulatedContactsDict = {}
-        start = time.time()
-        for key in allkeys:
-            accumulatedContactsDict[key] = []
-            for frame_dict in frame_contacts_accumulated:
-                if key not in frame_dict:  # puts empty score TempContactAccumulate in dict
-                    key1, key2 = makeKeyArraysFromKey(key)
-                    emptyCont = TempContactAccumulate(key1, key2)
-                    emptyCont.fscore = 0
-                    frame_dict[key] = emptyCont
-                accumulatedContactsDict[key].append(frame_dict[key])
+        blockArgs = []
+        for b in blocks:
+            blockArgs.append((directory, b[0], b[-1] + 1, map1, map2))
+        progressChannel.reset(len(self.contactResults), self.frameUpdate.emit)
+        results, throughput = run_frame_blocks(pool, loop_frame, blockArgs, [len(b) for b in blocks],
+                                               progressChannel)
+        # the blocks are consecutive, their matrices are joined along the frames in a single pass
+        matrix = ScoreMatrix.concatenate(results)
+        trajectoryData = self.getTrajectoryData()
+        groups1, groups2 = group_ids(trajectoryData, map1), group_ids(trajectoryData, map2)
+        contactKeys = contact_keys(self.contactResults.contacts["idx1"], self.contactResults.contacts["idx2"],
+                                   groups1, groups2)
+        return matrix, contactKeys, groups1, groups2
+
+    def sharedContactResults(self):
+        """Returns the directory the tables of contactResults are shared with the workers in (cf. ContactStore.share).
+
+            the tables are written once per version of contactResults, to /dev/shm if it has room for them,
+            and removed when contactResults is replaced (cf. releaseSharedContacts) or on exit
+        """
+        generation = self.contactResults.generation
+        if self.sharedContacts is None or self.sharedContacts[0] != generation:
+            self.releaseSharedContacts()
+            location = shared_memory_dir(self.contactResults.nbytes)
+            directory = tempfile.mkdtemp(prefix="pycontact", dir=location)
+            atexit.register(shutil.rmtree, directory, True)
+            try:
+                self.contactResults.share(directory)
+            except (IOError, OSError):
+                if location is None:
+                    raise
+                # /dev/shm ran full, the tables are mapped from a file in the temp dir instead
+                shutil.rmtree(directory, True)
+                directory = tempfile.mkdtemp(prefix="pycontact")
+                atexit.register(shutil.rmtree, directory, True)
+                self.contactResults.share(directory)
+            self.sharedContacts = (generation, directory)
+        return self.sharedContacts[1]
+
+    def releaseSharedContacts(self):
+        """Removes the tables shared by sharedContactResults, e.g. when the Analyzer is replaced."""
+        if self.sharedContacts is not None:
+            shutil.rmtree(self.sharedContacts[1], True)
+            self.sharedContacts = None
+
+    def accumulatedContacts(self, contactResults, matrix, contactKeys, map1, map2, groups1, groups2):
+        """Creates the AccumulatedContacts of all rows of the ScoreMatrix matrix.
+
+            contactKeys: integer key of every contact row of contactResults, the contributingAtoms of every
+            AccumulatedContact refer to the contact rows of its key (cf. ContributingAtoms)
+        """
+        trajectoryData = self.getTrajectoryData()
+        # contact rows grouped by matrix row, each group stays sorted by contact row (i.e. frame)
+        matrixRows = matrix.rowsOf(contactKeys)
+        contactRows = np.argsort(matrixRows, kind="mergesort")
+        bounds = np.searchsorted(matrixRows[contactRows], np.arange(len(matrix) + 1))
         finalAccumulatedContacts = []  # list of AccumulatedContacts
-        for key in accumulatedContactsDict:
-            key1, key2 = makeKeyArraysFromKey(key)
-            acc = AccumulatedContact(key1, key2)
-            for tempContact in accumulatedContactsDict[key]:
-                acc.addScore(tempContact.fscore)
-                acc.addContributingAtoms(tempContact.contributingAtomContacts)
-                acc.bb1 += tempContact.bb1score
-                acc.bb2 += tempContact.bb2score
-                acc.sc1 += tempContact.sc1score
-                acc.sc2 += tempContact.sc2score
+        for row, key in enumerate(matrix.keys.tolist()):
+            acc = matrix.accumulatedContact(row, *key_arrays(key, trajectoryData, map1, map2, groups1, groups2))
+            acc.contributingAtoms = ContributingAtoms(contactResults, contactRows[bounds[row]:bounds[row + 1]])
             finalAccumulatedContacts.append(acc)
-        # stop = time.time()
-        # print(stop - start)
-        glob_stop = time.time()
-        # print(glob_stop - start)
-        # self.progressWidget.hide()
         return finalAccumulatedContacts
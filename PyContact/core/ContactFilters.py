@@ -5,6 +5,8 @@ from __future__ import print_function
 import numpy as np
 
 from .Biochemistry import *
+from .contact_statistics import (mean_scores, median_scores, hbond_percentages, total_times, mean_life_times,
+                                 median_life_times)
 
 
 class Operator(object):
@@ -30,14 +32,18 @@ class FrameFilter(object):
 
     @staticmethod
     def extractFrameRange(contacts, frameRange):
+        """Returns views of contacts restricted to frameRange, the given contacts are not changed."""
         lower = frameRange[0]
         upper = frameRange[1]
+        ranged = []
         for c in contacts:
-            newScores = c.scoreArray[lower:upper]
-            newAtoms = c.contributingAtoms[lower:upper]
-            c.contributingAtoms = newAtoms
-            c.scoreArray = newScores
-        return contacts
+            view = c.view()
+            view.scoreArray = c.scoreArray[lower:upper]
+            view.contributingAtoms = c.contributingAtoms[lower:upper]
+            if c.hbondFrameCounts is not None:
+                view.hbondFrameCounts = c.hbondFrameCounts[lower:upper]
+            ranged.append(view)
+        return ranged
 
 
 class NameFilter(object):
@@ -168,11 +174,8 @@ class OnlyFilter(object):
         filtered = []
         if self.operator == "hbonds":
             for c in contacts:
-                hb = c.hbondFramesScan()
-                for bla in hb:
-                    if bla > 0:
-                        filtered.append(c)
-                        break
+                if c.hbondFramesScan().countAbove(0) > 0:
+                    filtered.append(c)
         elif self.operator == "hydrophobic":
             for c in contacts:
                 if c.determine_ctype() == ContactType.hydrophobic:
@@ -196,8 +199,8 @@ class TotalTimeFilter(BinaryFilter):
     def filterContacts(self, contacts):
         filtered = []
         op = Operator()
-        for c in contacts:
-            if op.compare(c.total_time(1, 0), self.value, self.operator):
+        for c, totalTime in zip(contacts, total_times(contacts, 1, 0).tolist()):
+            if op.compare(totalTime, self.value, self.operator):
                 filtered.append(c)
         print(unicode(len(filtered)))
         return filtered
@@ -213,20 +216,16 @@ class ScoreFilter(BinaryFilter):
         filtered = []
         op = Operator()
         if self.ftype == u"Mean":
-            for c in contacts:
-                mean = c.mean_score()
-                if op.compare(mean, self.value, self.operator):
-                    filtered.append(c)
+            values = mean_scores(contacts)
         elif self.ftype == u"Median":
-            for c in contacts:
-                med = c.median_score()
-                if op.compare(med, self.value, self.operator):
-                    filtered.append(c)
+            values = median_scores(contacts)
         elif self.ftype == u"HB \%":
-            for c in contacts:
-                med = c.hbond_percentage()
-                if op.compare(med, self.value, self.operator):
-                    filtered.append(c)
+            values = hbond_percentages(contacts)
+        else:
+            return filtered
+        for c, value in zip(contacts, values.tolist()):
+            if op.compare(value, self.value, self.operator):
+                filtered.append(c)
         return filtered
 
 
@@ -264,15 +263,15 @@ class Sorting(object):
         elif self.key == u"resid B":
             sortedContacts = sorted(contacts, key=lambda c: prop2, reverse=self.descending)
         elif self.key == u"total time":
-            for con in contacts:
-                con.total_time(self.nspf, self.threshold)
-            sortedContacts = sorted(contacts, key=lambda c: c.ttime, reverse=self.descending)
+            sortedContacts = self.sortedByValues(contacts, total_times(contacts, self.nspf, self.threshold))
         elif self.key == u"mean lifetime":
-            for con in contacts:
-                con.mean_life_time(self.nspf, self.threshold)
-            sortedContacts = sorted(contacts, key=lambda c: c.meanLifeTime, reverse=self.descending)
+            sortedContacts = self.sortedByValues(contacts, mean_life_times(contacts, self.nspf, self.threshold))
         elif self.key == u"median lifetime":
-            for con in contacts:
-                con.median_life_time(self.nspf, self.threshold)
-            sortedContacts = sorted(contacts, key=lambda c: c.medianLifeTime, reverse=self.descending)
+            sortedContacts = self.sortedByValues(contacts, median_life_times(contacts, self.nspf, self.threshold))
         return sortedContacts
+
+    def sortedByValues(self, contacts, values):
+        """Sorts contacts by the array values, which holds one value per contact."""
+        values = values.tolist()
+        order = sorted(range(len(contacts)), key=lambda i: values[i], reverse=self.descending)
+        return [contacts[i] for i in order]
@@ -0,0 +1,263 @@
+from __future__ import print_function
+import itertools
+import os
+
+import numpy as np
+
+from .Biochemistry import AtomContact, HydrogenBond
+
+# one row per atom contact, idx1/idx2 are global atom indices
+contactDtype = np.dtype([("frame", np.int32), ("idx1", np.int32), ("idx2", np.int32),
+                         ("distance", np.float64), ("weight", np.float64)])
+# one row per hydrogen bond (candidate), contact is the row of the corresponding atom contact
+hbondDtype = np.dtype([("contact", np.int64), ("donor", np.int32), ("acceptor", np.int32), ("hydrogen", np.int32),
+                       ("distance", np.float64), ("angle", np.float64)])
+
+
+def accepted_hbonds(candidates, hbondcutoff, hbondcutangle):
+    """Returns the mask of the hbond candidates meeting the distance and angle criteria."""
+    return (candidates["distance"] <= hbondcutoff) & (candidates["angle"] >= hbondcutangle)
+
+
+# source of the ContactStore generation ids, cf. ContactStore.modified
+_generations = itertools.count()
+
+
+def shared_memory_dir(nbytes=0):
+    """Returns the directory for nbytes of tables shared with worker processes, /dev/shm if it is available
+        and has room for them (None: temp dir). Container defaults of /dev/shm are as small as 64 MB.
+    """
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        stat = os.statvfs("/dev/shm")
+        if stat.f_bavail * stat.f_frsize >= nbytes:
+            return "/dev/shm"
+    return None
+
+
+class ContactStore(object):
+    """Columnar storage of the atom contacts of a frame scan.
+
+        contacts: structured array (contactDtype) of all atom contacts, sorted by frame
+        offsets: CSR offsets, the contacts of the i-th scanned frame are contacts[offsets[i]:offsets[i+1]]
+        candidates: structured array (hbondDtype) of all donor-hydrogen-acceptor geometries within
+                    envelope = (maximum H...A distance, minimum D-H...A angle), sorted by contact row
+        hbonds: the candidates meeting hbondcutoff and hbondcutangle
+        generation: id that is unique among all stores of the process, it changes whenever the tables change
+        Indexing or iterating the store yields lists of AtomContacts per frame,
+        which are created on demand only.
+    """
+
+    def __init__(self, contacts=None, offsets=None, candidates=None, hbondcutoff=0, hbondcutangle=0, envelope=None):
+        super(ContactStore, self).__init__()
+        self.contacts = contacts if contacts is not None else np.zeros(0, dtype=contactDtype)
+        self.offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self.candidates = candidates if candidates is not None else np.zeros(0, dtype=hbondDtype)
+        self.hbondcutoff = hbondcutoff
+        self.hbondcutangle = hbondcutangle
+        self.envelope = tuple(envelope) if envelope is not None else (hbondcutoff, hbondcutangle)
+        self.hbonds = self.candidates[accepted_hbonds(self.candidates, hbondcutoff, hbondcutangle)]
+        self.generation = next(_generations)
+
+    def __setstate__(self, state):
+        # sessions written before the hbond candidates were recorded only contain the accepted hbonds
+        if "candidates" not in state:
+            state["candidates"] = state["hbonds"]
+            state["envelope"] = (state["hbondcutoff"], state["hbondcutangle"])
+        self.__dict__.update(state)
+        self.generation = next(_generations)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def modified(self):
+        """Has to be called after changing the tables in place, gives the store a new generation id."""
+        self.generation = next(_generations)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                raise ValueError("ContactStore only supports contiguous frame slices")
+            return self.frameRange(start, max(start, stop))
+        if item < 0:
+            item += len(self)
+        if item < 0 or item >= len(self):
+            raise IndexError("frame index out of range")
+        return self.frameContacts(item)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.frameContacts(i)
+
+    @property
+    def numberOfContacts(self):
+        return len(self.contacts)
+
+    @property
+    def nbytes(self):
+        """Size of the tables written by share."""
+        return sum(getattr(self, table).nbytes for table in self.tables)
+
+    def frameRows(self, i):
+        """Returns the first and last+1 contact row of the i-th frame."""
+        return int(self.offsets[i]), int(self.offsets[i + 1])
+
+    def hbondRows(self, start, stop, table=None):
+        """Returns the first and last+1 row of table (default: hbonds) belonging to the contact rows start:stop."""
+        rows = np.searchsorted((self.hbonds if table is None else table)["contact"], [start, stop])
+        return int(rows[0]), int(rows[1])
+
+    def hbondCounts(self):
+        """Returns the number of hydrogen bonds of every contact row."""
+        return np.bincount(self.hbonds["contact"], minlength=len(self.contacts))
+
+    def atomContacts(self, start, stop):
+        """Creates AtomContact objects (including their HydrogenBonds) for the contact rows start:stop."""
+        hstart, hstop = self.hbondRows(start, stop)
+        hydrogenBonds = {}
+        for hb in self.hbonds[hstart:hstop]:
+            hydrogenBonds.setdefault(int(hb["contact"]), []).append(
+                HydrogenBond(int(hb["donor"]), int(hb["acceptor"]), int(hb["hydrogen"]), float(hb["distance"]),
+                             float(hb["angle"]), self.hbondcutoff, self.hbondcutangle))
+        atomContacts = []
+        for row in range(start, stop):
+            c = self.contacts[row]
+            atomContacts.append(AtomContact(c["frame"], c["distance"], c["weight"], c["idx1"], c["idx2"],
+                                            hydrogenBonds.get(row, [])))
+        return atomContacts
+
+    def rowAtomContacts(self, rows):
+        """Creates AtomContact objects (including their HydrogenBonds) for the sorted contact rows rows."""
+        rows = np.asarray(rows, dtype=np.int64)
+        hstarts = np.searchsorted(self.hbonds["contact"], rows, side="left")
+        hstops = np.searchsorted(self.hbonds["contact"], rows, side="right")
+        atomContacts = []
+        for row, hstart, hstop in zip(rows.tolist(), hstarts.tolist(), hstops.tolist()):
+            c = self.contacts[row]
+            hydrogenBonds = [HydrogenBond(int(hb["donor"]), int(hb["acceptor"]), int(hb["hydrogen"]),
+                                          float(hb["distance"]), float(hb["angle"]), self.hbondcutoff,
+                                          self.hbondcutangle) for hb in self.hbonds[hstart:hstop]]
+            atomContacts.append(AtomContact(c["frame"], c["distance"], c["weight"], c["idx1"], c["idx2"],
+                                            hydrogenBonds))
+        return atomContacts
+
+    def frameContacts(self, i):
+        """Returns the contacts of the i-th frame as list of AtomContacts."""
+        return self.atomContacts(*self.frameRows(i))
+
+    def frameRange(self, start, stop):
+        """Returns a new ContactStore containing the frames start:stop."""
+        first, last = int(self.offsets[start]), int(self.offsets[stop])
+        hstart, hstop = self.hbondRows(first, last, self.candidates)
+        candidates = self.candidates[hstart:hstop].copy()
+        candidates["contact"] -= first
+        return ContactStore(self.contacts[first:last].copy(), self.offsets[start:stop + 1] - first, candidates,
+                            self.hbondcutoff, self.hbondcutangle, self.envelope)
+
+    def withinCutoff(self, cutoff):
+        """Returns a new ContactStore with the contacts of distance <= cutoff and their hydrogen bonds.
+
+            equals a frame scan with cutoff if cutoff does not exceed the scanned cutoff,
+            the weights only depend on the distance and are kept
+        """
+        # the frame scan compares the double precision distance with the single precision cutoff
+        keep = self.contacts["distance"] <= np.float64(np.float32(cutoff))
+        # kept[i] is the number of kept contacts before row i
+        kept = np.zeros(len(self.contacts) + 1, dtype=np.int64)
+        np.cumsum(keep, out=kept[1:])
+        candidates = self.candidates[keep[self.candidates["contact"]]]
+        candidates["contact"] = kept[candidates["contact"]]
+        return ContactStore(self.contacts[keep], kept[self.offsets], candidates, self.hbondcutoff,
+                            self.hbondcutangle, self.envelope)
+
+    def withHbondCriteria(self, hbondcutoff, hbondcutangle):
+        """Returns a new ContactStore with the hydrogen bonds re-evaluated for hbondcutoff and hbondcutangle.
+
+            the criteria have to be within the envelope of the recorded candidates
+        """
+        if hbondcutoff > self.envelope[0] or hbondcutangle < self.envelope[1]:
+            raise ValueError("hbond criteria (%s, %s) exceed the recorded candidates (%s, %s)"
+                             % ((hbondcutoff, hbondcutangle) + self.envelope))
+        return ContactStore(self.contacts, self.offsets, self.candidates, hbondcutoff, hbondcutangle, self.envelope)
+
+    def save(self, path):
+        """Writes the store to the .npz file path."""
+        np.savez(path, contacts=self.contacts, offsets=self.offsets, candidates=self.candidates,
+                 criteria=np.array([self.hbondcutoff, self.hbondcutangle], dtype=np.float64),
+                 envelope=np.array(self.envelope, dtype=np.float64))
+
+    @staticmethod
+    def load(path):
+        """Reads a store written by save."""
+        with np.load(path) as data:
+            criteria = data["criteria"]
+            return ContactStore(data["contacts"], data["offsets"], data["candidates"], float(criteria[0]),
+                                float(criteria[1]), data["envelope"].tolist())
+
+    tables = ["contacts", "offsets", "candidates"]
+
+    def share(self, directory):
+        """Writes the tables as .npy files to directory, other processes map them into memory with attach."""
+        for table in self.tables:
+            np.save(os.path.join(directory, table + ".npy"), getattr(self, table))
+        np.save(os.path.join(directory, "criteria.npy"),
+                np.array([self.hbondcutoff, self.hbondcutangle] + list(self.envelope), dtype=np.float64))
+
+    @staticmethod
+    def attach(directory):
+        """Returns the store written by share to directory, its tables are read-only memory maps."""
+        tables = [np.load(os.path.join(directory, table + ".npy"), mmap_mode="r") for table in ContactStore.tables]
+        criteria = np.load(os.path.join(directory, "criteria.npy")).tolist()
+        return ContactStore(tables[0], tables[1], tables[2], criteria[0], criteria[1], criteria[2:])
+
+    @staticmethod
+    def fromFrames(frames, hbondcutoff=0, hbondcutangle=0, envelope=None):
+        """Builds a ContactStore from a list of (contacts, hbond candidates) arrays per frame.
+
+            the contact column of each frame's candidates refers to the row within the frame,
+            envelope are the criteria the candidates were recorded with (default: hbondcutoff, hbondcutangle)
+        """
+        counts = np.array([len(f[0]) for f in frames], dtype=np.int64)
+        offsets = np.zeros(len(frames) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        if len(frames) == 0:
+            return ContactStore(offsets=offsets, hbondcutoff=hbondcutoff, hbondcutangle=hbondcutangle,
+                                envelope=envelope)
+        contacts = np.concatenate([f[0] for f in frames]).astype(contactDtype)
+        candidates = np.concatenate([f[1] for f in frames]).astype(hbondDtype)
+        candidates["contact"] += np.repeat(offsets[:-1], [len(f[1]) for f in frames])
+        return ContactStore(contacts, offsets, candidates, hbondcutoff, hbondcutangle, envelope)
+
+    @staticmethod
+    def concatenate(stores):
+        """Joins the frames of several ContactStores in the given order."""
+        stores = list(stores)
+        if len(stores) == 0:
+            return ContactStore()
+        base = np.zeros(len(stores) + 1, dtype=np.int64)
+        np.cumsum([len(store.contacts) for store in stores], out=base[1:])
+        offsets = np.concatenate([np.zeros(1, dtype=np.int64)] +
+                                 [store.offsets[1:] + base[k] for k, store in enumerate(stores)])
+        candidates = np.concatenate([store.candidates for store in stores])
+        candidates["contact"] += np.repeat(base[:-1], [len(store.candidates) for store in stores])
+        return ContactStore(np.concatenate([store.contacts for store in stores]), offsets, candidates,
+                            stores[0].hbondcutoff, stores[0].hbondcutangle, stores[0].envelope)
+
+    @staticmethod
+    def fromAtomContacts(contactResults, hbondcutoff=0, hbondcutangle=0):
+        """Converts the former list of frames of AtomContact lists, e.g. from old session files.
+
+            only the accepted hydrogen bonds are known, they become the candidates
+        """
+        frames = []
+        for frame in contactResults:
+            contacts = np.zeros(len(frame), dtype=contactDtype)
+            hbonds = []
+            for row, cont in enumerate(frame):
+                contacts[row] = (cont.frame, cont.idx1, cont.idx2, cont.distance, cont.weight)
+                for hb in cont.hbondinfo:
+                    hbonds.append((row, hb.donorIndex, hb.acceptorIndex, hb.hydrogenIndex,
+                                   hb.acceptorHydrogenDistance, hb.angle))
+                    hbondcutoff, hbondcutangle = hb.usedCutoffDist, hb.usedCutoffAngle
+            frames.append((contacts, np.array(hbonds, dtype=hbondDtype)))
+        return ContactStore.fromFrames(frames, hbondcutoff, hbondcutangle)
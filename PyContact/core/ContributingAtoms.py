@@ -0,0 +1,53 @@
+from __future__ import print_function
+
+import numpy as np
+
+
+class ContributingAtoms(object):
+    """Per-frame lists of the AtomContacts contributing to an AccumulatedContact, created on access only.
+
+        store: ContactStore holding the atom contacts
+        rows: sorted contact rows of the store belonging to the AccumulatedContact, usually a view onto
+              one range of the rows of all contacts, grouped by contact key
+        firstFrame, length: frame i corresponds to frame firstFrame + i of the store
+        Indexing and iteration yield lists of AtomContacts like the former list of lists.
+    """
+
+    def __init__(self, store, rows, firstFrame=0, length=None):
+        super(ContributingAtoms, self).__init__()
+        self.store = store
+        self.rows = rows
+        self.firstFrame = firstFrame
+        self.length = len(store) - firstFrame if length is None else length
+
+    def __len__(self):
+        return self.length
+
+    def frameRows(self, start, stop):
+        """Returns the rows of the frames start:stop."""
+        if len(self.rows) == 0:
+            return self.rows
+        first, last = np.searchsorted(self.rows, [self.store.offsets[self.firstFrame + start],
+                                                  self.store.offsets[self.firstFrame + stop]])
+        return self.rows[first:last]
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                raise ValueError("ContributingAtoms only supports contiguous frame slices")
+            stop = max(start, stop)
+            return ContributingAtoms(self.store, self.frameRows(start, stop), self.firstFrame + start, stop - start)
+        if item < 0:
+            item += len(self)
+        if item < 0 or item >= len(self):
+            raise IndexError("frame index out of range")
+        return self.store.rowAtomContacts(self.frameRows(item, item + 1))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def numberOfContacts(self):
+        """Returns the number of contributing AtomContacts of all frames."""
+        return len(self.rows)
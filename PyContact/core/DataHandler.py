@@ -1,5 +1,7 @@
 import pickle
 
+from .ContactStore import ContactStore
+
 
 class DataHandler:
     """Handles the import or export of a session."""
@@ -13,6 +15,9 @@ class DataHandler:
         trajArgs = importDict["trajectory"]
         maps = importDict["maps"]
         contactResults = importDict["analyzer"][-1]
+        if not isinstance(contactResults, ContactStore):
+            # sessions written before the columnar ContactStore contain lists of AtomContacts
+            contactResults = ContactStore.fromAtomContacts(contactResults, arguments[3], arguments[4])
         del importDict
         return [contacts, arguments, trajArgs, maps, contactResults]
 
@@ -21,7 +26,7 @@ class DataHandler:
         """Saves the current Session (analysis) at 'filename'."""
         analyzerArgs = [analysis.psf, analysis.dcd, analysis.cutoff, analysis.hbondcutoff,
                         analysis.hbondcutangle, analysis.sel1text, analysis.sel2text,
-                        analysis.contactResults]
+                        analysis.start, analysis.stop, analysis.step, analysis.contactResults]
         trajArgs = analysis.getTrajectoryData()
         exportDict = {"contacts": analysis.finalAccumulatedContacts, "analyzer": analyzerArgs, "trajectory": trajArgs,
                       "maps": [analysis.lastMap1, analysis.lastMap2]}
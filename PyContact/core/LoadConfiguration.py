@@ -1,6 +1,7 @@
 class Configuration(object):
     """Sets the current configuration."""
-    def __init__(self, psf, dcd, cutoff, hbondcutoff, hbondcutangle, sel1text, sel2text):
+    def __init__(self, psf, dcd, cutoff, hbondcutoff, hbondcutangle, sel1text, sel2text, start=None, stop=None,
+                 step=None):
         super(Configuration, self).__init__()
         self.psf = psf
         self.dcd = dcd
@@ -9,3 +10,6 @@ class Configuration(object):
         self.hbondcutangle = hbondcutangle
         self.sel1text = sel1text
         self.sel2text = sel2text
+        self.start = start
+        self.stop = stop
+        self.step = step
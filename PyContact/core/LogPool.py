@@ -29,3 +29,49 @@ class LoggingPool(Pool):
     """Used for multiprocessing logging."""
     def apply_async(self, func, args=(), kwds={}, callback=None):
         return Pool.apply_async(self, LogExceptions(func), args, kwds, callback)
+
+
+# data kept resident in the workers of a WorkerPool, name -> value
+residentData = {}
+
+
+def setResidentData(data):
+    """Pool initializer, stores data in the worker process."""
+    residentData.clear()
+    residentData.update(data)
+
+
+class WorkerPool(object):
+    """Long-lived LoggingPool that is started lazily and reused for subsequent jobs.
+
+        data given to get() as name=(token, value) is sent to every worker once at startup and
+        can be read from residentData by the submitted functions. The pool is only restarted if the
+        number of processes changes or a requested name is not resident with the same token.
+    """
+    def __init__(self):
+        super(WorkerPool, self).__init__()
+        self.pool = None
+        self.nproc = 0
+        self.tokens = {}
+
+    def get(self, nproc, **resident):
+        """Returns a running pool of nproc processes holding the requested resident data."""
+        if self.pool is not None:
+            if nproc != self.nproc or any(name not in self.tokens or self.tokens[name] != resident[name][0]
+                                          for name in resident):
+                self.close()
+        if self.pool is None:
+            data = dict((name, resident[name][1]) for name in resident)
+            self.pool = LoggingPool(nproc, setResidentData, (data,))
+            self.nproc = nproc
+            self.tokens = dict((name, resident[name][0]) for name in resident)
+        return self.pool
+
+    def close(self):
+        """Stops the worker processes, a later get() starts a new pool."""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+        self.pool = None
+        self.nproc = 0
+        self.tokens = {}
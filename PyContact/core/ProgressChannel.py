@@ -0,0 +1,59 @@
+from __future__ import print_function
+import multiprocessing
+import time
+
+
+class ProgressChannel(object):
+    """Frame counter in shared memory, reporting the progress of worker processes to the main process.
+
+        Workers call frameDone() after every processed frame, this only increments the shared counter.
+        The main process calls reset() before submitting work and poll() while waiting, poll() invokes
+        the callback with the finished fraction at most once per interval seconds.
+        Worker processes have to be forked after the channel was created (cf. progressChannel).
+    """
+
+    def __init__(self, interval=0.1):
+        super(ProgressChannel, self).__init__()
+        self.counter = multiprocessing.Value("l", 0)
+        self.total = 0
+        self.interval = interval
+        self.callback = None
+        self.lastUpdate = 0.0
+
+    def reset(self, total, callback=None):
+        """Starts a new job of total frames, callback(fraction) receives the progress updates."""
+        with self.counter.get_lock():
+            self.counter.value = 0
+        self.total = total
+        self.callback = callback
+        self.lastUpdate = 0.0
+
+    def frameDone(self, frames=1):
+        """Adds processed frames, called by the workers."""
+        with self.counter.get_lock():
+            self.counter.value += frames
+
+    def fraction(self):
+        """Returns the finished fraction of the current job."""
+        if self.total <= 0:
+            return 1.0
+        return min(1.0, float(self.counter.value) / float(self.total))
+
+    def poll(self, force=False):
+        """Invokes the callback if the last update is at least interval seconds ago."""
+        now = time.time()
+        if self.callback is not None and (force or now - self.lastUpdate >= self.interval):
+            self.lastUpdate = now
+            self.callback(self.fraction())
+
+    def wait(self, results):
+        """Waits for a list of AsyncResults, updating the progress in between without busy waiting."""
+        for res in results:
+            while not res.ready():
+                res.wait(self.interval)
+                self.poll()
+        self.poll(True)
+
+
+# channel shared by the frame scan, accumulation and SASA workers, created before any pool is forked
+progressChannel = ProgressChannel()
@@ -0,0 +1,84 @@
+from __future__ import print_function
+import hashlib
+import os
+
+from .ContactStore import ContactStore
+from .Topology import cacheBaseDir, file_hash, file_version
+
+
+class ScanCache(object):
+    """Size bounded LRU cache of frame scan results (ContactStores) on disk.
+
+        Entries are addressed by the topology and trajectory files and the scan parameters (cf. key),
+        every entry is one .npz file in directory. The least recently used entries are removed
+        as soon as the total size exceeds maxSize bytes.
+        The files are identified by their content hash, or with contentKeys=False by their path, size and
+        modification time (cf. Topology.file_version), which avoids reading large trajectories before a scan.
+    """
+    # increase if the scan results change for identical parameters
+    cacheVersion = 2
+
+    def __init__(self, directory=None, maxSize=2 * 1024 ** 3, contentKeys=True):
+        super(ScanCache, self).__init__()
+        self.directory = directory if directory is not None else os.path.join(cacheBaseDir(), "scans")
+        self.maxSize = maxSize
+        self.contentKeys = contentKeys
+
+    def key(self, topologyFile, trajectoryFile, cutoff, hbondcutoff, hbondcutangle, sel1text, sel2text,
+            start=None, stop=None, step=None):
+        """Returns the cache key of a frame scan."""
+        fileKey = file_hash if self.contentKeys else file_version
+        parameters = [self.cacheVersion, fileKey(topologyFile), fileKey(trajectoryFile), float(cutoff),
+                      float(hbondcutoff), float(hbondcutangle), sel1text, sel2text, start, stop, step]
+        return hashlib.sha1(repr(parameters).encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def get(self, key):
+        """Returns the cached ContactStore of key, or None."""
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            store = ContactStore.load(path)
+            # the modification time marks the last use
+            os.utime(path, None)
+        except (IOError, OSError, KeyError, ValueError):
+            return None
+        return store
+
+    def put(self, key, store):
+        """Adds the ContactStore store as key and evicts the least recently used entries."""
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            # written to a temporary file first, a concurrent reader never sees a partial file
+            temporaryFile = "%s.%d.tmp.npz" % (key, os.getpid())
+            store.save(os.path.join(self.directory, temporaryFile))
+            os.rename(os.path.join(self.directory, temporaryFile), self.path(key))
+            self.evict()
+        except (IOError, OSError):
+            print("Scan cache %s is not writable" % self.directory)
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in maxSize."""
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".npz") and not name.endswith(".tmp.npz"):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.maxSize:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        """Removes all entries."""
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(".npz"):
+                    os.remove(os.path.join(self.directory, name))
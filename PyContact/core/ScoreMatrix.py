@@ -0,0 +1,124 @@
+from __future__ import print_function
+
+import numpy as np
+
+from .Biochemistry import AccumulatedContact
+from .SparseSeries import SparseSeries
+
+
+class ScoreMatrix(object):
+    """Accumulation of the atom contacts of a ContactStore per contact key and frame, stored in CSR layout.
+
+        keys: sorted integer contact keys (cf. multi_accumulation.contact_keys), one row per key
+        indptr: the cells of row i are indptr[i]:indptr[i+1], only (key, frame) cells with contacts are stored
+        frames, scores, hbondCounts: frame, summed contact weight and number of hydrogen bonds of every cell
+        bb1, sc1, bb2, sc2: backbone/sidechain scores of both contact partners, summed over all frames
+        AccumulatedContacts created by accumulatedContact hold SparseSeries views onto a row.
+    """
+
+    def __init__(self, keys, numberOfFrames, indptr, frames, scores, hbondCounts, bb1, sc1, bb2, sc2):
+        super(ScoreMatrix, self).__init__()
+        self.keys = keys
+        self.numberOfFrames = numberOfFrames
+        self.indptr = indptr
+        self.frames = frames
+        self.scores = scores
+        self.hbondCounts = hbondCounts
+        self.bb1 = bb1
+        self.sc1 = sc1
+        self.bb2 = bb2
+        self.sc2 = sc2
+
+    def __len__(self):
+        return len(self.keys)
+
+    def cellRows(self):
+        """Returns the row of every stored cell."""
+        return np.repeat(np.arange(len(self.keys)), np.diff(self.indptr))
+
+    @staticmethod
+    def empty():
+        """Returns a ScoreMatrix without frames and keys."""
+        zeros = np.zeros(0, dtype=np.float64)
+        return ScoreMatrix(np.zeros(0, dtype=np.int64), 0, np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                           zeros, np.zeros(0, dtype=np.int64), zeros, zeros, zeros, zeros)
+
+    @staticmethod
+    def fromStore(store, contactKeys, backboneMask):
+        """Accumulates the contacts of the ContactStore store.
+
+            contactKeys: integer key of every contact row of the store
+            backboneMask: boolean mask of all atoms, True for backbone atoms (cf. multi_accumulation.backbone_mask)
+        """
+        nframes = len(store)
+        frames = np.repeat(np.arange(nframes), np.diff(store.offsets))
+        keys, keyIndex = np.unique(contactKeys, return_inverse=True)
+        # flat (key, frame) cell of every contact, sorted by key and frame
+        cells, cellIndex = np.unique(keyIndex * nframes + frames, return_inverse=True)
+        weights = store.contacts["weight"]
+        scores = np.bincount(cellIndex, weights=weights, minlength=len(cells))
+        hbondCounts = np.bincount(cellIndex, weights=store.hbondCounts(), minlength=len(cells)).astype(np.int64)
+        rows, cellFrames = np.divmod(cells, max(nframes, 1))
+        indptr = np.searchsorted(rows, np.arange(len(keys) + 1))
+        subScores = np.zeros((4, len(keys)), dtype=np.float64)
+        for partner, column in enumerate(["idx1", "idx2"]):
+            isBackbone = backboneMask[store.contacts[column]]
+            subScores[2 * partner] = np.bincount(keyIndex, weights=weights * isBackbone, minlength=len(keys))
+            subScores[2 * partner + 1] = np.bincount(keyIndex, weights=weights * ~isBackbone, minlength=len(keys))
+        return ScoreMatrix(keys, nframes, indptr, cellFrames, scores, hbondCounts,
+                           subScores[0], subScores[1], subScores[2], subScores[3])
+
+    @staticmethod
+    def concatenate(matrices):
+        """Joins ScoreMatrices of consecutive frame blocks, the rows are aligned by key."""
+        matrices = list(matrices)
+        if len(matrices) == 0:
+            # e.g. the blocks of an empty frame range
+            return ScoreMatrix.empty()
+        keys = np.unique(np.concatenate([m.keys for m in matrices]))
+        subScores = np.zeros((4, len(keys)), dtype=np.float64)
+        rows, frames = [], []
+        first = 0
+        for m in matrices:
+            matrixRows = np.searchsorted(keys, m.keys)
+            rows.append(matrixRows[m.cellRows()])
+            frames.append(m.frames + first)
+            for i, sub in enumerate([m.bb1, m.sc1, m.bb2, m.sc2]):
+                subScores[i, matrixRows] += sub
+            first += m.numberOfFrames
+        rows = np.concatenate(rows)
+        # stable, the cells of every row stay in frame order
+        order = np.argsort(rows, kind="mergesort")
+        indptr = np.searchsorted(rows[order], np.arange(len(keys) + 1))
+        return ScoreMatrix(keys, first, indptr, np.concatenate(frames)[order],
+                           np.concatenate([m.scores for m in matrices])[order],
+                           np.concatenate([m.hbondCounts for m in matrices])[order],
+                           subScores[0], subScores[1], subScores[2], subScores[3])
+
+    def rollUp(self, rowKeys):
+        """Sums up the rows sharing their key in rowKeys (the new key of every row) to a coarser ScoreMatrix."""
+        keys, keyIndex = np.unique(rowKeys, return_inverse=True)
+        nframes = self.numberOfFrames
+        cells, cellIndex = np.unique(keyIndex[self.cellRows()] * nframes + self.frames, return_inverse=True)
+        scores = np.bincount(cellIndex, weights=self.scores, minlength=len(cells))
+        hbondCounts = np.bincount(cellIndex, weights=self.hbondCounts, minlength=len(cells)).astype(np.int64)
+        rows, cellFrames = np.divmod(cells, max(nframes, 1))
+        indptr = np.searchsorted(rows, np.arange(len(keys) + 1))
+        subScores = [np.bincount(keyIndex, weights=sub, minlength=len(keys))
+                     for sub in [self.bb1, self.sc1, self.bb2, self.sc2]]
+        return ScoreMatrix(keys, nframes, indptr, cellFrames, scores, hbondCounts, *subScores)
+
+    def rowsOf(self, contactKeys):
+        """Returns the row of every contact key."""
+        return np.searchsorted(self.keys, contactKeys)
+
+    def accumulatedContact(self, row, key1, key2):
+        """Returns an AccumulatedContact of the given row, its score series are views onto the matrix."""
+        first, last = self.indptr[row], self.indptr[row + 1]
+        acc = AccumulatedContact(key1, key2)
+        acc.scoreArray = SparseSeries(self.numberOfFrames, self.frames[first:last], self.scores[first:last])
+        acc.hbondFrameCounts = SparseSeries(self.numberOfFrames, self.frames[first:last],
+                                            self.hbondCounts[first:last])
+        acc.bb1, acc.sc1 = float(self.bb1[row]), float(self.sc1[row])
+        acc.bb2, acc.sc2 = float(self.bb2[row]), float(self.sc2[row])
+        return acc
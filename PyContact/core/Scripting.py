@@ -6,7 +6,8 @@ from PyContact.core.DataHandler import DataHandler
 
 class JobConfig:
     """Configuration/Settings for a PyContact contact analysis job"""
-    def __init__(self, cutoff, hbondcutoff, hbondcutangle, map1, map2, sel1, sel2):
+    def __init__(self, cutoff, hbondcutoff, hbondcutangle, map1, map2, sel1, sel2, start=None, stop=None, step=None,
+                 cacheDir=None, cacheSize=2 * 1024 ** 3):
         self.cutoff = cutoff
         self.hbondcutoff = hbondcutoff
         self.hbondcutangle = hbondcutangle
@@ -14,6 +15,14 @@ class JobConfig:
         self.map2 = map2
         self.sel1 = sel1
         self.sel2 = sel2
+        # frame range start:stop:step, e.g. step=10 to screen every 10th frame only
+        self.start = start
+        self.stop = stop
+        self.step = step
+        # frame scans are cached in cacheDir (default: ~/.pycontact/scans), bounded to cacheSize bytes
+        # cacheSize=0 disables the cache
+        self.cacheDir = cacheDir
+        self.cacheSize = cacheSize
 
 
 class PyContactJob:
@@ -26,11 +35,22 @@ class PyContactJob:
         self.configuration = configuration
         self.analyzer = None
 
-    def runJob(self, ncores=1):
-        """Runs contact analysis and accumulation with ncores threads."""
+    def runJob(self, ncores=1, streaming=False, threads=False):
+        """Runs contact analysis and accumulation with ncores threads.
+        With threads=True, the frame scan runs with ncores threads in this process instead of ncores processes.
+        With streaming=True, frames are accumulated while scanning (single core, bounded memory),
+        the atomic contacts are not kept.
+        Otherwise, a frame scan with identical input files and parameters is read from the scan cache."""
         print("Running job: " + self.name + " on " + str(ncores) + " cores.")
-        self.analyzer = Analyzer(self.topo,self.traj, self.configuration.cutoff, self.configuration.hbondcutoff, self.configuration.hbondcutangle, self.configuration.sel1, self.configuration.sel2)
-        self.analyzer.runFrameScan(ncores)
+        if self.analyzer is not None:
+            self.analyzer.releaseSharedContacts()
+        self.analyzer = Analyzer(self.topo,self.traj, self.configuration.cutoff, self.configuration.hbondcutoff, self.configuration.hbondcutangle, self.configuration.sel1, self.configuration.sel2, self.configuration.start, self.configuration.stop, self.configuration.step)
+        if streaming:
+            self.analyzer.runStreamingAnalysis(self.configuration.map1, self.configuration.map2)
+            return
+        if self.configuration.cacheSize > 0:
+            self.analyzer.scanCache = ScanCache(self.configuration.cacheDir, self.configuration.cacheSize)
+        self.analyzer.runFrameScan(ncores, threads)
         self.analyzer.runContactAnalysis(self.configuration.map1, self.configuration.map2, ncores)
 
     def writeSessionToFile(self, fname=""):
@@ -0,0 +1,160 @@
+from __future__ import print_function
+
+import numpy as np
+
+
+class SparseSeries(object):
+    """Per-frame series of values that only stores the frames with a nonzero value.
+
+        frames: sorted indices of the stored frames, values: the value of every stored frame.
+        All other frames up to length are zero. Indexing, slicing and iteration behave like a list
+        of the dense values, the statistics (sum, median, runsAbove, ...) work on the stored frames only.
+    """
+    # arrays owned by append, frames/values are views onto their first entries
+    frameBuffer = None
+    valueBuffer = None
+
+    def __init__(self, length=0, frames=None, values=None, dtype=np.float64):
+        super(SparseSeries, self).__init__()
+        self.length = int(length)
+        self.frames = frames if frames is not None else np.zeros(0, dtype=np.int64)
+        self.values = values if values is not None else np.zeros(0, dtype=dtype)
+
+    @staticmethod
+    def fromDense(values, dtype=np.float64):
+        """Creates the series of the dense sequence values."""
+        values = np.asarray(values, dtype=dtype)
+        frames = np.flatnonzero(values)
+        return SparseSeries(len(values), frames, values[frames])
+
+    @staticmethod
+    def concatenate(series):
+        """Joins the series one after another."""
+        series = list(series)
+        if len(series) == 0:
+            return SparseSeries()
+        starts = np.cumsum([0] + [len(s) for s in series])
+        return SparseSeries(starts[-1], np.concatenate([s.frames + start for s, start in zip(series, starts)]),
+                            np.concatenate([s.values for s in series]))
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                return SparseSeries.fromDense(self.toDense()[item], self.values.dtype)
+            stop = max(start, stop)
+            first, last = np.searchsorted(self.frames, [start, stop])
+            return SparseSeries(stop - start, self.frames[first:last] - start, self.values[first:last])
+        if item < 0:
+            item += len(self)
+        if item < 0 or item >= len(self):
+            raise IndexError("frame index out of range")
+        position = np.searchsorted(self.frames, item)
+        if position < len(self.frames) and self.frames[position] == item:
+            return self.values[position]
+        return self.values.dtype.type(0)
+
+    def __iter__(self):
+        zero = self.values.dtype.type(0)
+        frame = 0
+        for stored, value in zip(self.frames.tolist(), self.values):
+            while frame < stored:
+                yield zero
+                frame += 1
+            yield value
+            frame += 1
+        while frame < len(self):
+            yield zero
+            frame += 1
+
+    def __array__(self, dtype=None):
+        dense = self.toDense()
+        return dense if dtype is None else dense.astype(dtype)
+
+    def __str__(self):
+        # text exports print the series like the former lists
+        return str(self.tolist())
+
+    def toDense(self):
+        dense = np.zeros(len(self), dtype=self.values.dtype)
+        dense[self.frames] = self.values
+        return dense
+
+    def tolist(self):
+        return self.toDense().tolist()
+
+    def append(self, value):
+        """Appends the value of a new frame, the stored arrays grow by doubling their capacity."""
+        if value != 0:
+            count = len(self.frames)
+            # frames/values may be views onto arrays of other objects, e.g. a ScoreMatrix, those are not extended
+            if (self.frameBuffer is None or self.frames.base is not self.frameBuffer or
+                    self.values.base is not self.valueBuffer or count == len(self.frameBuffer)):
+                capacity = max(16, 2 * count)
+                self.frameBuffer = np.empty(capacity, dtype=self.frames.dtype)
+                self.valueBuffer = np.empty(capacity, dtype=self.values.dtype)
+                self.frameBuffer[:count] = self.frames
+                self.valueBuffer[:count] = self.values
+            self.frameBuffer[count] = self.length
+            self.valueBuffer[count] = value
+            self.frames = self.frameBuffer[:count + 1]
+            self.values = self.valueBuffer[:count + 1]
+        self.length += 1
+
+    def nonzeroCount(self):
+        """Returns the number of frames with a nonzero value."""
+        return int(np.count_nonzero(self.values))
+
+    def sum(self):
+        return self.values.sum()
+
+    def mean(self):
+        return self.values.sum() / float(len(self))
+
+    def median(self):
+        """Returns the median of all frames, including the zero frames."""
+        if len(self) == 0:
+            return np.nan
+        values = np.sort(self.values)
+        # the zeros sit between the negative and the positive stored values
+        negatives = int(np.searchsorted(values, 0, side="left"))
+        zeros = len(self) - len(values)
+
+        def kth(k):
+            if k < negatives:
+                return values[k]
+            if k < negatives + zeros:
+                return 0.0
+            return values[k - zeros]
+
+        middle = len(self) // 2
+        if len(self) % 2 == 1:
+            return kth(middle)
+        return (kth(middle - 1) + kth(middle)) / 2.0
+
+    def countAbove(self, threshold):
+        """Returns the number of frames with a value above threshold."""
+        count = int(np.count_nonzero(self.values > threshold))
+        if 0 > threshold:
+            count += len(self) - len(self.values)
+        return count
+
+    def runsAbove(self, threshold):
+        """Returns the first frame and the length of every run of consecutive frames with a value above threshold."""
+        if 0 > threshold:
+            # zero frames are above threshold, the runs lie between the stored frames below it
+            below = self.frames[self.values <= threshold]
+            bounds = np.concatenate(([-1], below, [len(self)]))
+            starts = bounds[:-1] + 1
+            lengths = bounds[1:] - starts
+            return starts[lengths > 0], lengths[lengths > 0]
+        above = self.frames[self.values > threshold]
+        if len(above) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        breaks = np.flatnonzero(np.diff(above) != 1) + 1
+        starts = above[np.concatenate(([0], breaks))]
+        ends = above[np.concatenate((breaks - 1, [len(above) - 1]))]
+        return starts, ends - starts + 1
@@ -0,0 +1,130 @@
+from __future__ import print_function
+import hashlib
+import os
+
+import numpy as np
+
+from .hbond_search import donor_hydrogen_table, hbond_capable_mask, heavy_atom_mask
+
+# content hashes of files, keyed by path, size and modification time
+_fileHashes = {}
+
+
+def file_version(path):
+    """Returns the absolute path, size and modification time of the file path, identifies it without reading it."""
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime
+
+
+def file_hash(path):
+    """Returns the content hash of the file path, computed once per file version."""
+    version = file_version(path)
+    if version not in _fileHashes:
+        _fileHashes[version] = Topology.fileHash(path)
+    return _fileHashes[version]
+
+
+class Topology(object):
+    """Per-atom properties of a topology, stored as numpy arrays indexed by the global atom index.
+
+        names, resnames and segids are stored as categorical codes into the arrays of their unique values,
+        backbone holds the indices of all backbone atoms and donorOffsets/donorHydrogens the
+        hydrogens bound to every donor (cf. hbond_search.donor_hydrogen_table).
+        Topologies are cached on disk, keyed by the hash of the topology file (cf. load).
+    """
+    # increase if the cached arrays change
+    cacheVersion = 1
+    fields = ["resnames", "resnameCodes", "resids", "names", "nameCodes", "segidValues", "segidCodes", "backbone",
+              "donorOffsets", "donorHydrogens"]
+
+    def __init__(self, **arrays):
+        super(Topology, self).__init__()
+        for field in self.fields:
+            setattr(self, field, arrays[field])
+
+    def __len__(self):
+        return len(self.resids)
+
+    @staticmethod
+    def fromUniverse(u):
+        """Extracts the topology arrays of all atoms of the MDAnalysis universe u."""
+        atoms = u.atoms
+        arrays = {"resids": np.asarray(atoms.resids, dtype=np.int64),
+                  "backbone": np.asarray(u.select_atoms("backbone").indices, dtype=np.int64)}
+        arrays["resnames"], arrays["resnameCodes"] = np.unique(np.asarray(atoms.resnames), return_inverse=True)
+        arrays["names"], arrays["nameCodes"] = np.unique(np.asarray(atoms.names), return_inverse=True)
+        arrays["segidValues"], arrays["segidCodes"] = np.unique(np.asarray(atoms.segids), return_inverse=True)
+        arrays["donorOffsets"], arrays["donorHydrogens"] = donor_hydrogen_table(atoms)
+        return Topology(**arrays)
+
+    @staticmethod
+    def fileHash(path):
+        """Returns the sha1 hex digest of the file's content."""
+        sha = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        return sha.hexdigest()
+
+    @staticmethod
+    def load(topologyFile, u, cacheDir=None):
+        """Returns the Topology of the universe u, which was created from topologyFile.
+
+            The arrays are read from the cache in cacheDir (default: defaultCacheDir()) if the topology
+            file has been processed before, otherwise they are extracted from u and written to the cache.
+            The cache is skipped if it can not be read or written.
+        """
+        if cacheDir is None:
+            cacheDir = defaultCacheDir()
+        try:
+            cacheFile = os.path.join(cacheDir, "%s_v%d.npz" % (file_hash(topologyFile), Topology.cacheVersion))
+        except (IOError, OSError):
+            return Topology.fromUniverse(u)
+        if os.path.exists(cacheFile):
+            try:
+                with np.load(cacheFile) as cached:
+                    topology = Topology(**dict((field, cached[field]) for field in Topology.fields))
+                if len(topology) == len(u.atoms):
+                    return topology
+            except (IOError, OSError, KeyError, ValueError):
+                pass
+        topology = Topology.fromUniverse(u)
+        try:
+            if not os.path.isdir(cacheDir):
+                os.makedirs(cacheDir)
+            # written to a temporary file first, a concurrent reader never sees a partial file
+            temporaryFile = "%s.%d.tmp.npz" % (cacheFile[:-4], os.getpid())
+            np.savez(temporaryFile, **dict((field, getattr(topology, field)) for field in Topology.fields))
+            os.rename(temporaryFile, cacheFile)
+        except (IOError, OSError):
+            print("Topology cache %s is not writable" % cacheDir)
+        return topology
+
+    def resnameArray(self):
+        return self.resnames[self.resnameCodes]
+
+    def nameArray(self):
+        return self.names[self.nameCodes]
+
+    def segidArray(self):
+        return self.segidValues[self.segidCodes]
+
+    def trajectoryData(self):
+        """Returns the decoded arrays in the order resname_array, resid_array, name_array, segids, backbone."""
+        return [self.resnameArray(), self.resids, self.nameArray(), self.segidArray(), self.backbone]
+
+    def hbondTopology(self):
+        """Returns the donor table and the hbond capable and heavy atom masks used by the hbond search."""
+        # the masks are evaluated for the unique names only
+        return [(self.donorOffsets, self.donorHydrogens), hbond_capable_mask(self.names)[self.nameCodes],
+                heavy_atom_mask(self.names)[self.nameCodes]]
+
+
+def cacheBaseDir():
+    """Returns the directory of all PyContact caches, set PYCONTACT_CACHE to override ~/.pycontact."""
+    return os.environ.get("PYCONTACT_CACHE", os.path.join(os.path.expanduser("~"), ".pycontact"))
+
+
+def defaultCacheDir():
+    """Returns the topology cache directory."""
+    return os.path.join(cacheBaseDir(), "topology")
@@ -5,14 +5,34 @@ from ..cy_modules import cy_gridsearch
 
 
 class AroundSelection(DistanceSelection):
-    """Implements a more efficient computation when 'around' is used in the selections."""
+    """Implements a more efficient computation when 'around' is used in the selections.
+
+        The atom pairs within cutoff + skin are kept in a neighbor list (Verlet list) between
+        subsequent applications, it is only rebuilt if the selections change or an atom moved
+        more than skin/2. Use DynamicSelection to keep the parsed selection across frames.
+    """
     token = 'around'
     precedence = 1
+    # skin distance of the neighbor list in Angstrom
+    skin = 2.0
 
     def __init__(self, parser, tokens):
         super(AroundSelection, self).__init__()
         self.cutoff = float(tokens.popleft())
         self.sel = parser.parse_expression(self.precedence)
+        self.neighbors = None
+
+    def neighborList(self, sysIndices, selIndices, syspos, selpos):
+        """Returns the candidate pairs (sys, sel) within cutoff + skin, rebuilt only if necessary."""
+        if self.neighbors is not None:
+            oldSys, oldSel, refSys, refSel, pairs = self.neighbors
+            if np.array_equal(oldSys, sysIndices) and np.array_equal(oldSel, selIndices):
+                shift = np.concatenate((syspos - refSys, selpos - refSel))
+                if len(shift) == 0 or np.max(np.sum(shift * shift, axis=1)) <= (0.5 * self.skin) ** 2:
+                    return pairs
+        pairs = cy_gridsearch.cy_find_contacts(syspos, selpos, self.cutoff + self.skin)[0:2]
+        self.neighbors = (sysIndices, selIndices, syspos.copy(), selpos.copy(), pairs)
+        return pairs
 
     def _apply_KDTree(self, group):
         """KDTree based selection is about 7x faster than distmat
@@ -26,26 +46,17 @@ class AroundSelection(DistanceSelection):
         # All atoms in group that aren't in sel
         sys = group[~np.in1d(group.indices, sel.indices)]
         if custom:
-            # print("custom KD tree running")
-            syspos = sys.positions
-            selpos = sel.positions
-
-            sys_ones = np.ones(np.size(syspos, 0), dtype=np.int32)
-            sys_zeros = np.zeros(np.size(syspos, 0), dtype=np.int32)
-
-            sel_ones = np.ones(np.size(selpos, 0), dtype=np.int32)
-            sel_zeros = np.zeros(np.size(selpos, 0), dtype=np.int32)
-
-            all_positions = np.concatenate((syspos, selpos), axis=0)
-            flgs = np.concatenate((sys_ones, sel_zeros), axis=0)
-            others = np.concatenate((sys_zeros, sel_ones), axis=0)
+            syspos = sys.positions if len(sys) else np.zeros((0, 3), dtype=np.float32)
+            selpos = sel.positions if len(sel) else np.zeros((0, 3), dtype=np.float32)
+            sysPairs, selPairs = self.neighborList(sys.indices, sel.indices, syspos, selpos)
 
-            atom_number = flgs.size
-            result = cy_gridsearch.cy_find_within(all_positions, flgs, others, atom_number, self.cutoff)
-
-            real_result = result[0:np.size(syspos, 0)]
-            found_indices = np.where(real_result != 0)[0]
-            unique_idx = np.unique(found_indices)
+            # same criterion as cy_find_within: squared float distance < cutoff^2
+            delta = syspos[sysPairs] - selpos[selPairs]
+            delta *= delta
+            dist2 = delta[:, 0] + delta[:, 1]
+            dist2 += delta[:, 2]
+            cutoff = np.float32(self.cutoff)
+            unique_idx = np.unique(sysPairs[dist2 < cutoff * cutoff])
             return unique(sys[unique_idx.astype(np.int32)])
         else:
             kdtree = KDTree(dim=3, bucket_size=10)
@@ -71,3 +82,20 @@ class AroundSelection(DistanceSelection):
         mask = (dist <= self.cutoff).any(axis=1)
 
         return unique(sys[mask])
+
+
+class DynamicSelection(object):
+    """Atom selection that is parsed once and re-evaluated for the current frame by update().
+
+        In contrast to calling universe.select_atoms every frame, the neighbor lists of
+        'around' selections are kept between frames.
+    """
+    def __init__(self, universe, selectionText):
+        super(DynamicSelection, self).__init__()
+        self.universe = universe
+        self.selectionText = selectionText
+        self.selection = Parser.parse(selectionText, {})
+
+    def update(self):
+        """Returns the AtomGroup of the selection in the current frame."""
+        return self.selection.apply(self.universe.atoms)
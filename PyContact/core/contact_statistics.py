@@ -0,0 +1,154 @@
+"""Statistics of all AccumulatedContacts at once, computed from their sparse series.
+
+Every function returns an array aligned with the given list of contacts. The per-contact methods of
+AccumulatedContact (mean_score, life_time, ...) give the same values for a single contact.
+"""
+from __future__ import print_function
+
+import numpy as np
+
+
+def series_matrix(seriesList):
+    """Joins SparseSeries to one CSR matrix, returns the length, row pointer, frames and values of the rows."""
+    lengths = np.array([len(s) for s in seriesList], dtype=np.int64)
+    indptr = np.zeros(len(seriesList) + 1, dtype=np.int64)
+    np.cumsum([len(s.frames) for s in seriesList], out=indptr[1:])
+    if len(seriesList) == 0:
+        return lengths, indptr, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+    frames = np.concatenate([s.frames for s in seriesList]).astype(np.int64)
+    values = np.concatenate([s.values for s in seriesList]).astype(np.float64)
+    return lengths, indptr, frames, values
+
+
+def row_ids(indptr):
+    """Returns the row of every entry of a CSR matrix."""
+    return np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+
+def grouped_median(lengths, indptr, values):
+    """Returns the median of every row, the entries missing from a row of length lengths[i] count as zeros."""
+    rows = row_ids(indptr)
+    values = values[np.lexsort((values, rows))]
+    # per row: the negative values, the zeros and the positive values follow each other
+    negatives = np.bincount(rows[values < 0], minlength=len(lengths))
+    zeros = lengths - np.diff(indptr)
+
+    def kth(k):
+        position = indptr[:-1] + np.where(k < negatives, k, k - zeros)
+        picked = values[np.clip(position, 0, len(values) - 1)] if len(values) > 0 else np.zeros(len(k))
+        isZero = (k >= negatives) & (k < negatives + zeros)
+        return np.where(isZero, 0.0, picked)
+
+    middle = lengths // 2
+    median = np.where(lengths % 2 == 1, kth(middle), (kth(np.maximum(middle - 1, 0)) + kth(middle)) / 2.0)
+    return np.where(lengths > 0, median, np.nan)
+
+
+def mean_scores(contacts):
+    """Returns the mean score of every contact."""
+    lengths, indptr, frames, values = series_matrix([c.scoreArray for c in contacts])
+    sums = np.bincount(row_ids(indptr), weights=values, minlength=len(contacts))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return sums / lengths
+
+
+def median_scores(contacts):
+    """Returns the median score of every contact."""
+    lengths, indptr, frames, values = series_matrix([c.scoreArray for c in contacts])
+    return grouped_median(lengths, indptr, values)
+
+
+def counts_above(lengths, indptr, values, threshold):
+    """Returns the number of frames above threshold of every row."""
+    counts = np.bincount(row_ids(indptr)[values > threshold], minlength=len(lengths))
+    if 0 > threshold:
+        counts += lengths - np.diff(indptr)
+    return counts
+
+
+def total_times(contacts, nsPerFrame, threshold):
+    """Returns the total time every contact's score is above threshold."""
+    lengths, indptr, frames, values = series_matrix([c.scoreArray for c in contacts])
+    return counts_above(lengths, indptr, values, threshold) * nsPerFrame
+
+
+def hbond_percentages(contacts):
+    """Returns the percentage of frames with hydrogen bonds of every contact."""
+    lengths, indptr, frames, values = series_matrix([c.hbondFramesScan() for c in contacts])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return counts_above(lengths, indptr, values, 0) / lengths.astype(np.float64) * 100
+
+
+def life_times(contacts, nsPerFrame, threshold):
+    """Returns the life times of all contacts as CSR (row pointer, life times), cf. AccumulatedContact.life_time.
+
+        the runs of consecutive frames above threshold are found by run-length encoding, a contact that is
+        not active in its last frame gets an additional zero life time
+    """
+    seriesList = [c.scoreArray for c in contacts]
+    if 0 > threshold:
+        # the zero frames are above threshold, the runs are determined per contact
+        runLengths = [s.runsAbove(threshold) for s in seriesList]
+        runRows = np.repeat(np.arange(len(contacts)), [len(starts) for starts, lengths in runLengths])
+        runs = np.concatenate([lengths for starts, lengths in runLengths] + [np.zeros(0, dtype=np.int64)])
+        runEnds = np.concatenate([starts + lengths for starts, lengths in runLengths] +
+                                 [np.zeros(0, dtype=np.int64)])
+        lengths = np.array([len(s) for s in seriesList], dtype=np.int64)
+    else:
+        lengths, indptr, frames, values = series_matrix(seriesList)
+        above = values > threshold
+        rows, frames = row_ids(indptr)[above], frames[above]
+        # a run starts in a new row or after a gap
+        starts = np.ones(len(rows), dtype=bool)
+        starts[1:] = (rows[1:] != rows[:-1]) | (frames[1:] != frames[:-1] + 1)
+        startIndex = np.flatnonzero(starts)
+        runRows = rows[startIndex]
+        runs = np.diff(np.append(startIndex, len(rows)))
+        runEnds = frames[startIndex] + runs
+    # rows without a run reaching their last frame get a zero life time
+    lastActive = np.zeros(len(contacts), dtype=bool)
+    lastActive[runRows[runEnds == lengths[runRows]]] = True
+    zeroRows = np.flatnonzero(~lastActive & (lengths > 0))
+    allRows = np.concatenate((runRows, zeroRows))
+    allTimes = np.concatenate((runs * nsPerFrame, np.zeros(len(zeroRows)))).astype(np.float64)
+    order = np.argsort(allRows, kind="mergesort")
+    indptr = np.searchsorted(allRows[order], np.arange(len(contacts) + 1))
+    return indptr, allTimes[order]
+
+
+def mean_life_times(contacts, nsPerFrame, threshold):
+    """Returns the mean life time of every contact."""
+    indptr, times = life_times(contacts, nsPerFrame, threshold)
+    sums = np.bincount(row_ids(indptr), weights=times, minlength=len(contacts))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return sums / np.diff(indptr)
+
+
+def median_life_times(contacts, nsPerFrame, threshold):
+    """Returns the median life time of every contact."""
+    indptr, times = life_times(contacts, nsPerFrame, threshold)
+    return grouped_median(np.diff(indptr), indptr, times)
+
+
+def named_statistic(contacts, name, nsPerFrame=1, threshold=0):
+    """Returns the statistic name ("Mean Score", "Median Score", "Mean Lifetime", "Median Lifetime",
+        "Hbond percentage") of every contact.
+    """
+    if name == "Mean Score":
+        return mean_scores(contacts)
+    elif name == "Median Score":
+        return median_scores(contacts)
+    elif name == "Mean Lifetime":
+        return mean_life_times(contacts, nsPerFrame, threshold)
+    elif name == "Median Lifetime":
+        return median_life_times(contacts, nsPerFrame, threshold)
+    elif name == "Hbond percentage":
+        return hbond_percentages(contacts)
+    raise ValueError("unknown statistic %s" % name)
+
+
+def set_scores(contacts):
+    """Sets meanScore and medianScore of all contacts, cf. AccumulatedContact.setScores."""
+    for c, mean, median in zip(contacts, mean_scores(contacts).tolist(), median_scores(contacts).tolist()):
+        c.meanScore = mean
+        c.medianScore = median
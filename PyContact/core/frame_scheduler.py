@@ -0,0 +1,60 @@
+"""Dynamic scheduling of small frame blocks on a worker pool."""
+from __future__ import print_function
+import math
+import os
+import time
+from multiprocessing import TimeoutError
+
+
+def frame_blocks(seq, nproc, blocksPerWorker=8):
+    """Splits seq into consecutive blocks, about blocksPerWorker blocks for each of the nproc workers."""
+    size = max(1, int(math.ceil(len(seq) / float(nproc * blocksPerWorker))))
+    return [seq[i:i + size] for i in range(0, len(seq), size)]
+
+
+def _run_block(task):
+    """Runs one block in a worker, returns the block index, worker id, frame count, runtime and result."""
+    blockIndex, nframes, func, args = task
+    start = time.time()
+    result = func(*args)
+    return blockIndex, os.getpid(), nframes, time.time() - start, result
+
+
+def run_frame_blocks(pool, func, blockArgs, blockFrames, progress=None):
+    """Hands the blocks to the pool workers on demand and returns the results in block order.
+
+        blockArgs: argument tuples for func, one per block
+        blockFrames: number of frames of every block, used for the throughput report
+        progress: ProgressChannel that is polled while waiting for the blocks
+        returns the list of results and a dict worker id -> (frames, busy time)
+    """
+    tasks = [(i, nframes, func, args) for i, (nframes, args) in enumerate(zip(blockFrames, blockArgs))]
+    # one block per request, a worker fetches the next block as soon as it is idle
+    finished = pool.imap_unordered(_run_block, tasks, 1)
+    results = [None] * len(tasks)
+    throughput = {}
+    remaining = len(tasks)
+    while remaining > 0:
+        try:
+            blockIndex, worker, nframes, runtime, result = finished.next(progress.interval if progress else None)
+        except TimeoutError:
+            progress.poll()
+            continue
+        results[blockIndex] = result
+        frames, busy = throughput.get(worker, (0, 0.0))
+        throughput[worker] = (frames + nframes, busy + runtime)
+        remaining -= 1
+        if progress is not None:
+            progress.poll()
+    if progress is not None:
+        progress.poll(True)
+    print_throughput(throughput)
+    return results, throughput
+
+
+def print_throughput(throughput):
+    """Prints the number of frames and frames per second of every worker."""
+    for worker in sorted(throughput):
+        frames, busy = throughput[worker]
+        rate = frames / busy if busy > 0 else float("inf")
+        print("worker %d: %d frames in %.2f s (%.1f frames/s)" % (worker, frames, busy, rate))
@@ -0,0 +1,128 @@
+from __future__ import print_function
+
+import numpy as np
+
+from .Biochemistry import HydrogenBondAtoms
+from ..cy_modules import cy_gridsearch
+
+
+# hbond candidates are recorded up to this H...A distance and down to this D-H...A angle,
+# the hbond criteria can be changed within these limits without a new frame scan
+envelopeCutoff = 3.5
+envelopeAngle = 90.0
+
+
+def candidate_envelope(hbondcutoff, hbondcutangle):
+    """Returns the (distance, angle) criteria hbond candidates are recorded with for the given hbond criteria."""
+    return max(float(hbondcutoff), envelopeCutoff), min(float(hbondcutangle), envelopeAngle)
+
+
+def hbond_capable_mask(name_array):
+    """Returns a boolean mask of all atoms that can take part in a hydrogen bond (as donor or acceptor)."""
+    names, codes = np.unique(np.asarray(name_array, dtype=str), return_inverse=True)
+    capable = np.array([len(name) > 0 and name[0] in HydrogenBondAtoms.atoms for name in names], dtype=bool)
+    return capable[codes]
+
+
+def heavy_atom_mask(name_array):
+    """Returns a boolean mask of all non-hydrogen atoms."""
+    return ~np.char.startswith(np.asarray(name_array, dtype=str), "H")
+
+
+def donor_hydrogen_table(atoms):
+    """Builds a CSR table of the hydrogen atoms bound to every potential hbond donor.
+
+        the hydrogen atoms bound to atom i are hydrogens[offsets[i]:offsets[i+1]], i is the global atom index
+        only atoms of atoms named O*, N* or S* (cf. HydrogenBondAtoms) get entries, bonded atoms are
+        considered hydrogens if the bond type and the atom name start with "H"
+    """
+    universe = atoms.universe
+    natoms = len(universe.atoms)
+    offsets = np.zeros(natoms + 1, dtype=np.intp)
+    # the bond list of the universe is an index array already, atoms.bonds is built per atom
+    bonds = np.array(universe.bonds.to_indices(), dtype=np.intp).reshape(-1, 2)
+    if len(bonds) == 0:
+        return offsets, np.zeros(0, dtype=np.intp)
+    names = np.asarray(universe.atoms.names)
+    donorCapable = np.zeros(natoms, dtype=bool)
+    donorCapable[atoms.indices] = hbond_capable_mask(atoms.names)
+    hydrogenName = ~heavy_atom_mask(names)
+    hydrogenType = np.char.startswith(np.asarray(universe.atoms.types, dtype=str), "H")
+    # every bond in both directions, ordered by donor and then by bond, as in atom.bonds
+    donors = np.concatenate((bonds[:, 0], bonds[:, 1]))
+    partners = np.concatenate((bonds[:, 1], bonds[:, 0]))
+    order = np.lexsort((np.tile(np.arange(len(bonds)), 2), donors))
+    donors, partners = donors[order], partners[order]
+    keep = (donorCapable[donors] & hydrogenName[partners] &
+            (hydrogenType[donors] | hydrogenType[partners]))
+    donors, hydrogens = donors[keep], partners[keep]
+    np.cumsum(np.bincount(donors, minlength=natoms), out=offsets[1:])
+    return offsets, hydrogens
+
+
+def local_index_map(natoms, indices):
+    """Returns the selection-local index of every atom, -1 for atoms outside the selection with global indices."""
+    lookup = np.full(natoms, -1, dtype=np.intp)
+    lookup[indices] = np.arange(len(indices))
+    return lookup
+
+
+def _expand_hydrogens(rows, donors, offsets, hydrogens):
+    """Repeats every row once per hydrogen of its donor, returns the repeated rows and the hydrogen indices."""
+    counts = offsets[donors + 1] - offsets[donors]
+    total = counts.sum()
+    if total == 0:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    repeated = np.repeat(rows, counts)
+    # position of every entry inside its donor's slice of the table
+    shift = np.repeat(offsets[donors] - (np.cumsum(counts) - counts), counts)
+    return repeated, hydrogens[shift + np.arange(total)]
+
+
+def find_hydrogen_bonds(contacts1, contacts2, indices1, indices2, positions1, positions2,
+                        donorTable, capable, hbondcutoff, hbondcutangle, lookups=None):
+    """Evaluates the hbond criteria for all candidate contacts of one frame at once.
+
+        contacts1/contacts2 are selection-local indices of the contacting heavy atoms,
+        indices1/indices2 convert them to global atom indices.
+        returns the arrays rows, donors, acceptors, hydrogens, distances, angles of all accepted
+        hydrogen bonds, rows refer to the position in contacts1/contacts2, donor/acceptor/hydrogen
+        are global atom indices. For every row, bonds with the donor in sel1 come first.
+        lookups are the local_index_map of both selections, they only change with the selections
+        and should be built once by the caller (default: built for this frame).
+    """
+    offsets, hydrogens = donorTable
+    if lookups is None:
+        lookups = local_index_map(len(capable), indices1), local_index_map(len(capable), indices2)
+    global1 = indices1[contacts1]
+    global2 = indices2[contacts2]
+    candidates = np.where(capable[global1] & capable[global2])[0]
+
+    results = []
+    # direction 0: donor in sel1, acceptor in sel2; direction 1: vice versa
+    for direction in range(2):
+        if direction == 0:
+            donorLocal, acceptorLocal = contacts1, contacts2
+            donorIndices, donorPositions, acceptorPositions = indices1, positions1, positions2
+            lookup = lookups[0]
+        else:
+            donorLocal, acceptorLocal = contacts2, contacts1
+            donorIndices, donorPositions, acceptorPositions = indices2, positions2, positions1
+            lookup = lookups[1]
+        rows, hatoms = _expand_hydrogens(candidates, donorIndices[donorLocal[candidates]], offsets, hydrogens)
+        # convert global hydrogen indices to selection-local ones, hydrogens outside the selection are skipped
+        hlocal = lookup[hatoms]
+        inSelection = hlocal >= 0
+        rows, hatoms, hlocal = rows[inSelection], hatoms[inSelection], hlocal[inSelection]
+        # geometry is evaluated without the GIL
+        dist, angle = cy_gridsearch.cy_hbond_geometry(donorPositions[donorLocal[rows]], donorPositions[hlocal],
+                                                      acceptorPositions[acceptorLocal[rows]])
+        accepted = (dist <= hbondcutoff) & (angle >= hbondcutangle)
+        rows = rows[accepted]
+        results.append((rows, np.full(len(rows), direction, dtype=np.intp), donorIndices[donorLocal[rows]],
+                        (indices2 if direction == 0 else indices1)[acceptorLocal[rows]],
+                        hatoms[accepted], dist[accepted], angle[accepted]))
+
+    rows, directions, donors, acceptors, hatoms, dist, angle = [np.concatenate(x) for x in zip(*results)]
+    order = np.lexsort((directions, rows))
+    return rows[order], donors[order], acceptors[order], hatoms[order], dist[order], angle[order]
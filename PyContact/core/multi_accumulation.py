@@ -2,82 +2,13 @@ from __future__ import print_function
 import math
 import multiprocessing
 
-from .Biochemistry import *
-analysisProgressManager = multiprocessing.Manager()
-analysisProgressDict = analysisProgressManager.dict()
-
-
-def find_between(s, first, last):
-        try:
-            start = s.index(first) + len(first)
-            end = s.index(last, start)
-            return s[start:end]
-        except ValueError:
-            return ""
-
+import numpy as np
 
-def makeKeyArraysFromKey(key):
-    """Converts a key to two key arrays.
-        "inverse" function of makeKeyFromKeyArrays
-    """
-    keystring1, keystring2 = key.split("-")
-    mapping = AccumulationMapIndex.mapping
-    maximal = len(mapping)
-    key1 = []
-    for i in range(0, maximal):
-        current = mapping[i]
-        if current not in keystring1:
-            key1.append("none")
-            continue
-        if i == (maximal - 1):
-            key1.append(keystring1[keystring1.index(current) + len(current):])
-            break
-        nextCurrent = mapping[i + 1]
-        if nextCurrent not in keystring1:
-            nxt = ""
-            for k in mapping[i + 1:]:
-                if k in keystring1[keystring1.index(current) + len(current):]:
-                    nxt = k
-                    break
-            if nxt != "":
-                key1.append(keystring1[keystring1.index(current) + len(current):keystring1.index(nxt)])
-            else:
-                key1.append(keystring1[keystring1.index(current) + len(current):])
-            continue
-        else:
-            currentValue = find_between(keystring1, current, nextCurrent)
-            if currentValue == "":
-                key1.append("none")
-            else:
-                key1.append(currentValue)
-    key2 = []
-    for i in range(0, maximal):
-        current = mapping[i]
-        if current not in keystring2:
-            key2.append("none")
-            continue
-        if i == (maximal - 1):
-            key2.append(keystring2[keystring2.index(current) + len(current):])
-            break
-        nextCurrent = mapping[i + 1]
-        if nextCurrent not in keystring2:
-            nxt = ""
-            for k in mapping[i + 1:]:
-                if k in keystring2[keystring2.index(current) + len(current):]:
-                    nxt = k
-                    break
-            if nxt != "":
-                key2.append(keystring2[keystring2.index(current) + len(current):keystring2.index(nxt)])
-            else:
-                key2.append(keystring2[keystring2.index(current) + len(current):])
-            continue
-        else:
-            currentValue = find_between(keystring2, current, nextCurrent)
-            if currentValue == "":
-                key2.append("none")
-            else:
-                key2.append(currentValue)
-    return [key1, key2]
+from .Biochemistry import *
+from .LogPool import residentData
+from .ProgressChannel import progressChannel
+from .ScoreMatrix import ScoreMatrix
+from .ContactStore import ContactStore
 
 
 def chunks_old(l, n):
@@ -105,117 +36,114 @@ def chunks(seq, num):
     return out
 
 
-def makeKeyArraysFromMaps(map1, map2, contact):
-    """Creates key Arrays from the chosen accumulation maps."""
-    idx1 = contact.idx1
-    idx2 = contact.idx2
-    counter = 0
-    keys1 = []
-    for val in map1:
-        if val == 1:
-            if counter == AccumulationMapIndex.index:
-                keys1.append(idx1)
-            elif counter == AccumulationMapIndex.name:
-                keys1.append(name_array[idx1])
-            elif counter == AccumulationMapIndex.resid:
-                keys1.append(resid_array[idx1])
-            elif counter == AccumulationMapIndex.resname:
-                keys1.append(resname_array[idx1])
-            elif counter == AccumulationMapIndex.segid:
-                keys1.append(segids[idx1])
-        else:
-            keys1.append("none")
-        counter += 1
-    counter = 0
-    keys2 = []
-    for val in map2:
-        if val == 1:
-            if counter == AccumulationMapIndex.index:
-                keys2.append(idx2)
-            elif counter == AccumulationMapIndex.name:
-                keys2.append(name_array[idx2])
-            elif counter == AccumulationMapIndex.resid:
-                keys2.append(resid_array[idx2])
-            elif counter == AccumulationMapIndex.resname:
-                keys2.append(resname_array[idx2])
-            elif counter == AccumulationMapIndex.segid:
-                keys2.append(segids[idx2])
-        else:
-            keys2.append("none")
-        counter += 1
-    return [keys1, keys2]
-
-
-def makeKeyFromKeyArrays(key1, key2):
-    """Returns a human readable key from two key arrays.
-        example:
-        keys1=["none","none","none","14", "VAL", "none"]
-        keys2=["none","none","none","22", "ILE, "none"]
-        returns a human readable key with the mapping identifiers in AccumulationMapIndex
-        in the given example data:
-        key="r.14rn.VAL-r.22rn.ILE"
-        key is used to accumulated contacts in a dictionary (= a contact's unique identifier)
+def group_ids(trajectoryData, accumulationMap):
+    """Assigns an integer id to every atom, atoms sharing all properties chosen in accumulationMap share the id.
+
+        trajectoryData: resname_array, resid_array, name_array, segids, ... (cf. Analyzer.getTrajectoryData)
+        accumulationMap: five boolean values, cf. AccumulationMapIndex
+        returns the id of every atom and one representative atom per id
+    """
+    resname_array, resid_array, name_array, segids = trajectoryData[0:4]
+    natoms = len(resid_array)
+    fields = [np.arange(natoms), name_array, resid_array, resname_array, segids]
+    columns = []
+    for field, used in enumerate(accumulationMap[:len(fields)]):
+        if used == 1:
+            # strings are replaced by their categorical codes
+            columns.append(np.unique(np.asarray(fields[field]), return_inverse=True)[1])
+    if len(columns) == 0:
+        return np.zeros(natoms, dtype=np.int64), np.zeros(1, dtype=np.int64)
+    rows, representatives, ids = np.unique(np.column_stack(columns), axis=0, return_index=True,
+                                           return_inverse=True)
+    return ids.astype(np.int64), representatives
+
+
+def finest_map(accumulationMaps):
+    """Returns the map selecting every property selected by any of accumulationMaps.
+
+        The groups of every map are unions of the groups of the finest map (cf. rolled_up_keys).
+    """
+    return [int(any(m[field] == 1 for m in accumulationMaps)) for field in range(len(accumulationMaps[0]))]
+
+
+def rolled_up_keys(keys, groups1, groups2, coarse1, coarse2):
+    """Maps the integer contact keys of the groups groups1/groups2 to the keys of the coarser groups coarse1/coarse2.
+
+        all groups are group_ids results, every group of groups1 has to lie within one group of coarse1
     """
-    key = ""
-    itemcounter = 0
-    for item in key1:
-        if item != "none":
-            key += AccumulationMapIndex.mapping[itemcounter] + str(item)
-        itemcounter += 1
-    key += "-"
-    itemcounter = 0
-    for item in key2:
-        if item != "none":
-            key += AccumulationMapIndex.mapping[itemcounter] + str(item)
-        itemcounter += 1
+    group1, group2 = np.divmod(keys, len(groups2[1]))
+    return coarse1[0][groups1[1][group1]] * len(coarse2[1]) + coarse2[0][groups2[1][group2]]
+
+
+def backbone_mask(trajectoryData):
+    """Returns a boolean mask of all atoms, True for the backbone atoms (trajectoryData[4])."""
+    mask = np.zeros(len(trajectoryData[1]), dtype=bool)
+    mask[np.asarray(trajectoryData[4], dtype=np.int64)] = True
+    return mask
+
+
+def key_array(trajectoryData, accumulationMap, atom):
+    """Returns the key array of atom for accumulationMap, e.g. ["none", "none", "14", "VAL", "none"]."""
+    resname_array, resid_array, name_array, segids = trajectoryData[0:4]
+    fields = [None, name_array, resid_array, resname_array, segids]
+    key = []
+    for field, used in enumerate(accumulationMap[:len(fields)]):
+        if used != 1:
+            key.append("none")
+        elif field == AccumulationMapIndex.index:
+            key.append(str(atom))
+        else:
+            key.append(str(fields[field][atom]))
     return key
 
 
-def loop_frame(contacts, map1, map2, trajArgs, rank):
-    """Performs contact analysis multicore"""
-    allkeys = []
-    results = []
-    global backbone
-    global name_array
-    global resid_array
-    global resname_array
-    global segids
-    frames_processed = 0
-    backbone, name_array, resid_array, resname_array, segids = trajArgs[4], trajArgs[2], trajArgs[1], trajArgs[0], trajArgs[3]
-
-    for frame in contacts:
-        currentFrameAcc = {}
-        for cont in frame:
-            key1, key2 = makeKeyArraysFromMaps(map1, map2, cont)
-            key = makeKeyFromKeyArrays(key1, key2)
-            # global rank
-            # print key, rank
-            if key in currentFrameAcc:
-                currentFrameAcc[key].fscore += cont.weight
-                currentFrameAcc[key].contributingAtomContacts.append(cont)
-                if cont.idx1 in backbone:
-                    currentFrameAcc[key].bb1score += cont.weight
-                else:
-                    currentFrameAcc[key].sc1score += cont.weight
-                if cont.idx2 in backbone:
-                    currentFrameAcc[key].bb2score += cont.weight
-                else:
-                    currentFrameAcc[key].sc2score += cont.weight
-            else:
-                currentFrameAcc[key] = TempContactAccumulate(key1, key2)
-                currentFrameAcc[key].fscore += cont.weight
-                currentFrameAcc[key].contributingAtomContacts.append(cont)
-                if cont.idx1 in backbone:
-                    currentFrameAcc[key].bb1score += cont.weight
-                else:
-                    currentFrameAcc[key].sc1score += cont.weight
-                if cont.idx2 in backbone:
-                    currentFrameAcc[key].bb2score += cont.weight
-                else:
-                    currentFrameAcc[key].sc2score += cont.weight
-            if not (key in allkeys):
-                allkeys.append(key)
-        results.append(currentFrameAcc)
-        frames_processed += 1
-        analysisProgressDict[rank] = frames_processed
-    return [allkeys, results]
+def contact_keys(idx1, idx2, groups1, groups2):
+    """Returns the integer key of every contact, packing the group ids (cf. group_ids) of both atoms."""
+    return groups1[0][idx1] * len(groups2[1]) + groups2[0][idx2]
+
+
+def key_arrays(key, trajectoryData, map1, map2, groups1, groups2):
+    """Returns the key arrays of both contact partners of the integer key (cf. contact_keys)."""
+    group1, group2 = divmod(int(key), len(groups2[1]))
+    return [key_array(trajectoryData, map1, groups1[1][group1]), key_array(trajectoryData, map2, groups2[1][group2])]
+
+
+# group ids of the resident topology, computed once per worker and map
+_residentGroups = {}
+
+
+def resident_groups(accumulationMap):
+    """Returns group_ids of the topology resident in this worker (cf. WorkerPool)."""
+    topology = residentData["topology"]
+    memo = (id(topology), tuple(accumulationMap))
+    if memo not in _residentGroups:
+        _residentGroups[memo] = group_ids(topology, accumulationMap)
+    return _residentGroups[memo]
+
+
+# ContactStores shared by the main process, attached once per worker
+_sharedStores = {}
+
+
+def shared_store(directory):
+    """Returns the ContactStore shared in directory (cf. ContactStore.share), mapped once per worker."""
+    if directory not in _sharedStores:
+        _sharedStores.clear()
+        _sharedStores[directory] = ContactStore.attach(directory)
+    return _sharedStores[directory]
+
+
+def loop_frame(directory, first, last, map1, map2):
+    """Performs contact analysis multicore on the frames first:last of the ContactStore shared in directory
+
+        the topology arrays are resident in the worker (cf. WorkerPool), the contact tables are
+        memory maps (cf. ContactStore.share), returns the ScoreMatrix of the frames
+    """
+    trajectoryData = residentData["topology"]
+    contacts = shared_store(directory)[first:last]
+    groups1, groups2 = resident_groups(map1), resident_groups(map2)
+    contactKeys = contact_keys(contacts.contacts["idx1"], contacts.contacts["idx2"], groups1, groups2)
+    matrix = ScoreMatrix.fromStore(contacts, contactKeys, backbone_mask(trajectoryData))
+    progressChannel.frameDone(len(contacts))
+    return matrix
+
@@ -1,281 +1,238 @@
 from __future__ import print_function
 import os
-import re
 import time
-from copy import deepcopy
-import itertools
+import collections
+from multiprocessing.pool import ThreadPool
 
 import MDAnalysis
-from MDAnalysis.analysis import distances
 
 from .Biochemistry import *
 from .LogPool import *
-
-
-def weight_function(value):
-    """weight function to score contact distances"""
-    return 1.0 / (1.0 + np.exp(5.0 * (value - 4.0)))
-
-
-def chunks(seq, num):
-    """splits the list seq in num (almost) equally sized chunks."""
-    avg = len(seq) / float(num)
-    out = []
-    last = 0.0
-
-    while last < len(seq):
-        out.append(seq[int(last):int(last + avg)])
-        last += avg
-
-    return out
-
-
-class ConvBond(object):
-    """Python object of MDAnalysis bond for running jobs in parallel."""
-    def __init__(self, bonds):
-        super(ConvBond, self).__init__()
-        self.types = []
-        self.indices = []
-        for b in bonds:
-            self.indices.append(deepcopy(b.indices))
-            self.types.append(deepcopy(b.type))
-
-    def types(self):
-        return self.types
-
-    def to_indices(self):
-        return self.indices
-
-
-def loop_trajectory(sel1c, sel2c, indices1, indices2, config, suppl, selfInteraction):
-    """Invoked to analyze trajectory chunk for contacts as a single thread."""
-    # print(len(sel1c) , len(sel2c))
-    # indices1 = suppl[0]
-    # indices2 = suppl[1]
+from .ContactStore import ContactStore, contactDtype, hbondDtype
+from .hbond_search import find_hydrogen_bonds, candidate_envelope, local_index_map
+from .Topology import Topology
+from .aroundPatch import AroundSelection, DynamicSelection
+from .frame_scheduler import frame_blocks, run_frame_blocks
+from .ProgressChannel import progressChannel
+from ..cy_modules import cy_gridsearch
+
+
+def self_contacts(first, second, distances, indices, resid_array, segids):
+    """Applies the self-interaction exclusion to the unique pairs first < second of one selection.
+
+        a contact i-j is dropped if resid(i) - resid(j) < 5 and both atoms are in the same segment,
+        both orientations i-j and j-i of a pair are checked and returned (sorted like the full matrix)
+        resid_array and segids have to be numpy arrays
+    """
+    global1, global2 = indices[first], indices[second]
+    otherSegment = segids[global1] != segids[global2]
+    gap = resid_array[global1] - resid_array[global2]
+    forward = otherSegment | (gap >= 5)
+    backward = otherSegment | (gap <= -5)
+    contacts1 = np.concatenate((first[forward], second[backward]))
+    contacts2 = np.concatenate((second[forward], first[backward]))
+    contactDistances = np.concatenate((distances[forward], distances[backward]))
+    order = np.lexsort((contacts2, contacts1))
+    return contacts1[order], contacts2[order], contactDistances[order]
+
+
+def scan_frame(frame, positions1, positions2, indices1, indices2, lookups, config, hbondTopology, selfInteraction,
+               resid_array=None, segids=None, nthreads=1):
+    """Searches all contacts of one frame and returns them as contact and hbond candidate arrays for the ContactStore.
+
+        positions/indices are the coordinates and global atom indices of both selections,
+        lookups their global to local index maps (cf. hbond_search.local_index_map)
+        hbondTopology contains the donor-hydrogen table, the hbond capable and the heavy atom masks
+        with selfInteraction, selection 2 is selection 1 and resid_array/segids (numpy arrays) are required
+        the pair search, weighting and hbond geometry run without the GIL, the pair search uses nthreads threads
+        all hbond candidates within candidate_envelope(hbondcutoff, hbondcutangle) are returned
+    """
     cutoff, hbondcutoff, hbondcutangle = config
-    # resname_array = comm.bcast(resname_array, root=0)
-    # resid_array = comm.bcast(resid_array, root=0)
-    # name_array = comm.bcast(name_array, root=0)
-    bonds = suppl[0]
-    # segids = comm.bcast(segids, root=0)
-    # backbone = comm.bcast(backbone, root=0)
-    name_array = suppl[1]
-
-    resid_array = []
-    segids = []
-    if (selfInteraction):
-        resid_array = suppl[2]
-        segids = suppl[3]
-
-    allRankContacts = []
-    # start = time.time()
-    for s1, s2 in zip(sel1c, sel2c):
-        frame = 0
-        currentFrameContacts = []
-        result = np.ndarray(shape=(len(s1), len(s2)), dtype=float)
-        distarray = distances.distance_array(s1, s2, box=None, result=result)
-        contacts = np.where(distarray <= cutoff)
-        for idx1, idx2 in itertools.izip(contacts[0], contacts[1]):
-            convindex1 = indices1[frame][idx1]  # idx1 converted to global atom indexing
-            convindex2 = indices2[frame][idx2]  # idx2 converted to global atom indexing
-            # jump out of loop if hydrogen contacts are found, only contacts between heavy atoms are considered,
-            # hydrogen bonds can still be detected!
-            if re.match("H(.*)", name_array[convindex1]) or re.match("H(.*)", name_array[convindex2]):
-                continue
-            if selfInteraction:
-                if (resid_array[convindex1] - resid_array[convindex2]) < 5 and segids[convindex1] == segids[convindex2]:
-                    continue
-            # distance between atom1 and atom2
-            distance = distarray[idx1, idx2]
-            weight = weight_function(distance)
-            hydrogenBonds = []
-            if (name_array[convindex1][0] in HydrogenBondAtoms.atoms and name_array[convindex2][0] in HydrogenBondAtoms.atoms):
-                    # print("hbond? %s - %s" % (type_array[convindex1], type_array[convindex2]))
-                    # search for hatom, check numbering in bond!!!!!!!!!!
-                    b1 = bonds[convindex1]
-                    b2 = bonds[convindex2]
-                    bondcount1 = 0
-                    hydrogenAtomsBoundToAtom1 = []
-                    # new code
-                    for b in b1.types:
-                        # b = bnd.type
-                        hydrogen = next((xx for xx in b if xx.startswith("H")), 0)
-                        # print(b)
-                        if hydrogen != 0:
-                            # print("h bond to atom1")
-                            bondindices1 = b1.to_indices()[bondcount1]
-                            # print bondindices1
-                            # for j in bondindices1:
-                            #     print(self.type_array[j+1])
-                            hydrogenidx = next(
-                                (j for j in bondindices1 if name_array[j].startswith("H")), -1)
-                            if hydrogenidx != -1:
-                                # print(self.type_array[hydrogenidx])
-                                hydrogenAtomsBoundToAtom1.append(hydrogenidx)
-                        bondcount1 += 1
-                    # search for hydrogen atoms bound to atom 2
-                    bondcount2 = 0
-                    hydrogenAtomsBoundToAtom2 = []
-                    for b in b2.types:
-                        # b = bnd2.type
-                        hydrogen = next((xx for xx in b if xx.startswith("H")), 0)
-                        # print(b)
-                        if hydrogen != 0:
-                            # print("h bond to atom2")
-                            bondindices2 = b2.to_indices()[bondcount2]
-                            hydrogenidx = next(
-                                (k for k in bondindices2 if name_array[k].startswith("H")), -1)
-                            if hydrogenidx != -1:
-                                # print(type_array[hydrogenidx])
-                                hydrogenAtomsBoundToAtom2.append(hydrogenidx)
-                        bondcount2 += 1
-
-                    for global_hatom in hydrogenAtomsBoundToAtom1:
-                        conv_hatom = np.where(indices1[frame] == global_hatom)[0][0]
-                        dist = distarray[conv_hatom, idx2]
-                        if dist <= hbondcutoff:
-                            donorPosition = s1[idx1]
-                            hydrogenPosition = s1[conv_hatom]
-                            acceptorPosition = s2[idx2]
-                            v1 = hydrogenPosition - acceptorPosition
-                            v2 = hydrogenPosition - donorPosition
-                            v1norm = np.linalg.norm(v1)
-                            v2norm = np.linalg.norm(v2)
-                            dot = np.dot(v1, v2)
-                            angle = np.degrees(np.arccos(dot / (v1norm * v2norm)))
-                            if angle >= hbondcutangle:
-                                new_hbond = HydrogenBond(convindex1, convindex2, global_hatom, dist, angle,
-                                                         hbondcutoff,
-                                                         hbondcutangle)
-                                hydrogenBonds.append(new_hbond)
-                            # print str(convindex1) + " " + str(convindex2)
-                            # print "hbond found: %d,%d,%d"%(convindex1,global_hatom,convindex2)
-                            # print angle
-                    for global_hatom in hydrogenAtomsBoundToAtom2:
-                        conv_hatom = np.where(indices2[frame] == global_hatom)[0][0]
-                        dist = distarray[idx1, conv_hatom]
-                        if dist <= hbondcutoff:
-                            donorPosition = s2[idx2]
-                            hydrogenPosition = s2[conv_hatom]
-                            acceptorPosition = s1[idx1]
-                            v1 = hydrogenPosition - acceptorPosition
-                            v2 = hydrogenPosition - donorPosition
-                            v1norm = np.linalg.norm(v1)
-                            v2norm = np.linalg.norm(v2)
-                            dot = np.dot(v1, v2)
-                            angle = np.degrees(np.arccos(dot / (v1norm * v2norm)))
-                            if angle >= hbondcutangle:
-                                new_hbond = HydrogenBond(convindex2, convindex1, global_hatom, dist, angle,
-                                                         hbondcutoff,
-                                                         hbondcutangle)
-                                hydrogenBonds.append(new_hbond)
-            newAtomContact = AtomContact(int(frame), float(distance), float(weight), int(convindex1), int(convindex2),
-                                         hydrogenBonds)
-            currentFrameContacts.append(newAtomContact)
-        allRankContacts.append(currentFrameContacts)
-        frame += 1
-    return allRankContacts
-
-
-def run_load_parallel(nproc, psf, dcd, cutoff, hbondcutoff, hbondcutangle, sel1text, sel2text):
-    """Invokes nproc threads to run trajectory loading and contact analysis in parallel."""
-    # nproc = int(self.settingsView.coreBox.value())
-    pool = LoggingPool(nproc)
-    # manager = multiprocessing.Manager()
-    # d=manager.list(trajArgs)
-
-    # load psf and dcd
-    u = MDAnalysis.Universe(psf, dcd)
-    # define selections according to sel1text and sel2text
-
-    selfInteraction = False
-    if sel2text == "self":
-        sel1 = u.select_atoms(sel1text)
-        sel2 = u.select_atoms(sel1text)
-        selfInteraction = True
+    donorTable, hbondCapable, heavyAtoms = hbondTopology
+    if selfInteraction:
+        # both selections are identical, only the unique pairs are searched
+        contacts1, contacts2, contactDistances = cy_gridsearch.cy_find_contacts(positions1, positions1, cutoff, True,
+                                                                                nthreads)
+        keep = heavyAtoms[indices1[contacts1]] & heavyAtoms[indices1[contacts2]]
+        contacts1, contacts2, contactDistances = self_contacts(contacts1[keep], contacts2[keep], contactDistances[keep],
+                                                               indices1, resid_array, segids)
+        positions2, indices2 = positions1, indices1
     else:
-        sel1 = u.select_atoms(sel1text)
-        sel2 = u.select_atoms(sel2text)
-
-    # write properties of all atoms to lists
-    all_sel = u.select_atoms("all")
-    backbone_sel = u.select_atoms("backbone")
-    resname_array = []
-    resid_array = []
-    name_array = []
-    bonds = []
-    segids = []
-    backbone = []
-    for atom in all_sel.atoms:
-        resname_array.append(atom.resname)
-        resid_array.append(atom.resid)
-        name_array.append(atom.name)
-        bonds.append(ConvBond(atom.bonds))
-        segids.append(atom.segid)
-    for atom in backbone_sel:
-        backbone.append(atom.index)
-
+        # sparse cell list search, only pairs within cutoff are returned
+        # contacts1/contacts2 are selection-local, they do NOT correspond to a global atom index!
+        contacts1, contacts2, contactDistances = cy_gridsearch.cy_find_contacts(positions1, positions2, cutoff,
+                                                                                nthreads=nthreads)
+        # only contacts between heavy atoms are considered, hydrogen bonds can still be detected!
+        keep = heavyAtoms[indices1[contacts1]] & heavyAtoms[indices2[contacts2]]
+        contacts1, contacts2, contactDistances = contacts1[keep], contacts2[keep], contactDistances[keep]
+
+    contacts = np.zeros(len(contacts1), dtype=contactDtype)
+    contacts["frame"] = frame
+    contacts["idx1"] = indices1[contacts1]
+    contacts["idx2"] = indices2[contacts2]
+    contacts["distance"] = contactDistances
+    contacts["weight"] = cy_gridsearch.cy_contact_weights(contactDistances)
+
+    envelopeCutoff, envelopeAngle = candidate_envelope(hbondcutoff, hbondcutangle)
+    rows, donors, acceptors, hydrogens, hdist, hangle = find_hydrogen_bonds(
+        contacts1, contacts2, indices1, indices2, positions1, positions2, donorTable, hbondCapable,
+        envelopeCutoff, envelopeAngle, lookups)
+    candidates = np.zeros(len(rows), dtype=hbondDtype)
+    candidates["contact"] = rows
+    candidates["donor"] = donors
+    candidates["acceptor"] = acceptors
+    candidates["hydrogen"] = hydrogens
+    candidates["distance"] = hdist
+    candidates["angle"] = hangle
+    return contacts, candidates
+
+
+def select_atoms(u, sel1text, sel2text):
+    """Returns both selections and whether self-interaction (sel2text == "self") is wanted."""
+    if sel2text == "self":
+        return u.select_atoms(sel1text), u.select_atoms(sel1text), True
+    return u.select_atoms(sel1text), u.select_atoms(sel2text), False
+
+
+def read_frames(u, sel1text, sel2text, start, stop, step):
+    """Generator, yields frame number, positions, atom indices and index maps of both selections for the frames
+        start:stop:step, the index maps (cf. hbond_search.local_index_map) are only rebuilt if a selection changes.
+    """
+    sel1, sel2, selfInteraction = select_atoms(u, sel1text, sel2text)
+    natoms = len(u.atoms)
+    lookups = None
+    # 'around' selections are re-evaluated every frame, the parsed selections keep their neighbor lists
+    dynamic1 = DynamicSelection(u, sel1text) if "around" in sel1text else None
+    dynamic2 = DynamicSelection(u, sel2text) if "around" in sel2text else None
+    for ts in u.trajectory[start:stop:step]:
+        # define selections according to sel1text and sel2text
+        if dynamic1 is not None:
+            sel1 = dynamic1.update()
+        if dynamic2 is not None:
+            sel2 = dynamic2.update()
+        if selfInteraction:
+            sel2 = sel1
+        indices1, indices2 = sel1.indices, sel2.indices
+        if lookups is None or ((dynamic1 is not None or dynamic2 is not None) and
+                               not (np.array_equal(indices1, lookupIndices[0]) and
+                                    np.array_equal(indices2, lookupIndices[1]))):
+            # a new tuple, frames queued by scan_trajectory keep their maps
+            lookup1 = local_index_map(natoms, indices1)
+            lookups = (lookup1, lookup1 if selfInteraction else local_index_map(natoms, indices2))
+            lookupIndices = (indices1, indices2)
+        yield ts.frame, sel1.positions, sel2.positions, indices1, indices2, lookups
+
+
+def scan_trajectory(u, sel1text, sel2text, start, stop, step, config, hbondTopology, resid_array=None, segids=None,
+                    nthreads=1):
+    """Generator, scans the frames start:stop:step of the universe u and yields each frame's contact arrays.
+
+        with nthreads > 1, the frames are scanned by a pool of threads while the main thread
+        reads the trajectory, results are still yielded in frame order. If there are fewer frames
+        than threads, the remaining threads split the pair search of every frame (cf. scan_frame).
+    """
+    sel1, sel2, selfInteraction = select_atoms(u, sel1text, sel2text)
     if (len(sel1.atoms) == 0 or len(sel2.atoms) == 0):
         raise Exception
+    if selfInteraction:
+        resid_array, segids = np.asarray(resid_array), np.asarray(segids)
+    frameThreads = max(1, min(nthreads, len(frame_indices(len(u.trajectory), start, stop, step))))
+    frameArgs = (config, hbondTopology, selfInteraction, resid_array, segids, max(1, nthreads // frameThreads))
+    if frameThreads <= 1:
+        for frame in read_frames(u, sel1text, sel2text, start, stop, step):
+            yield scan_frame(*(frame + frameArgs))
+        return
+    pool = ThreadPool(frameThreads)
+    try:
+        # the scanning kernels release the GIL, a bounded number of frames is queued
+        pending = collections.deque()
+        for frame in read_frames(u, sel1text, sel2text, start, stop, step):
+            pending.append(pool.apply_async(scan_frame, frame + frameArgs))
+            if len(pending) >= 2 * frameThreads:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+
+
+def loop_trajectory(psf, dcd, start, stop, step, sel1text, sel2text, config):
+    """Invoked to analyze the trajectory frames start:stop:step for contacts as a single thread.
+
+        every worker opens the trajectory on its own, the topology derived arrays are
+        resident in the worker (cf. WorkerPool)
+    """
+    u = open_universe(psf, dcd)
+    resname_array, resid_array, name_array, segids, backbone = residentData["topology"]
+    frames = []
+    for frame in scan_trajectory(u, sel1text, sel2text, start, stop, step, config, residentData["hbondTopology"],
+                                 resid_array, segids):
+        frames.append(frame)
+        progressChannel.frameDone()
+    return ContactStore.fromFrames(frames, config[1], config[2], candidate_envelope(config[1], config[2]))
+
+
+# universe opened by this (worker) process, kept for subsequent frame blocks
+openUniverses = {}
+
+
+def open_universe(psf, dcd):
+    """Returns the universe of psf and dcd, only the most recently used one is kept open."""
+    if (psf, dcd) not in openUniverses:
+        openUniverses.clear()
+        openUniverses[(psf, dcd)] = MDAnalysis.Universe(psf, dcd)
+    return openUniverses[(psf, dcd)]
+
+
+def topology_token(psf):
+    """Identifies the topology data derived from the file psf, used to reuse resident worker data."""
+    try:
+        return os.path.abspath(psf), os.path.getmtime(psf)
+    except OSError:
+        return os.path.abspath(psf), None
+
+
+def frame_indices(nframes, start=None, stop=None, step=None):
+    """Returns the indices of the frames start:stop:step of a trajectory with nframes frames."""
+    return list(range(nframes))[start:stop:step]
+
+
+def run_load_parallel(nproc, psf, dcd, cutoff, hbondcutoff, hbondcutangle, sel1text, sel2text,
+                      start=None, stop=None, step=None, workerPool=None, progress=None):
+    """Invokes nproc threads to run trajectory loading and contact analysis in parallel.
+
+        only the frames start:stop:step are read and scanned
+        the workers of workerPool are reused, a temporary pool is used if it is None
+        progress(fraction) is called with the progress of the scan
+    """
+    # load psf and dcd, the topology is only read once in the main process
+    u = MDAnalysis.Universe(psf, dcd)
+    sel1, sel2, selfInteraction = select_atoms(u, sel1text, sel2text)
 
-    sel1coords = []
-    sel2coords = []
-    # start = time.time()
-    indices1 = []
-    indices2 = []
-
-    for ts in u.trajectory:
-        # define selections according to sel1text and sel2text
-        if "around" in sel1text:
-            sel1 = u.select_atoms(sel1text)
-        if "around" in sel2text:
-            sel2 = u.select_atoms(sel2text)
-        # write atomindices for each selection to list
-        sel1coords.append(sel1.positions)
-        sel2coords.append(sel2.positions)
-        # tempindices1 = []
-        # for at in sel1.atoms:
-        #     tempindices1.append(at.index)
-        # tempindices2 = []
-        # for at in sel2.atoms:
-        #     tempindices2.append(at.index)
-        indices1.append(sel1.indices)
-        indices2.append(sel2.indices)
-
-    # contactResults = []
-    # loop over trajectory
-    # totalFrameNumber = len(u.trajectory)
-    start = time.time()
-    sel1c = chunks(sel1coords, nproc)
-    sel2c = chunks(sel2coords, nproc)
-    sel1ind = chunks(indices1, nproc)
-    sel2ind = chunks(indices2, nproc)
-    # print(len(sel1ind), len(sel2ind))
-    # show trajectory information and selection information
-    # print("trajectory with %d frames loaded" % len(u.trajectory))
-
+    if (len(sel1.atoms) == 0 or len(sel2.atoms) == 0):
+        raise Exception
+    # properties of all atoms as arrays, cached for the topology file
+    topology = Topology.load(psf, u)
+    resname_array, resid_array, name_array, segids, backbone = topology.trajectoryData()
+
+    temporaryPool = workerPool is None
+    if temporaryPool:
+        workerPool = WorkerPool()
+    # only the compact tables of the hbond search are kept by the workers
+    hbondTopology = topology.hbondTopology()
+    token = topology_token(psf)
+    pool = workerPool.get(nproc, topology=(token, [resname_array, resid_array, name_array, segids, backbone]),
+                          hbondTopology=(token, hbondTopology))
+
+    # workers fetch small blocks of frames on demand and read them on their own
+    blocks = frame_blocks(frame_indices(len(u.trajectory), start, stop, step), nproc)
+    progressChannel.reset(sum(len(b) for b in blocks), progress)
     print("Running on %d cores" % nproc)
-    results = []
-    rank = 0
-    for c in zip(sel1c, sel2c, sel1ind, sel2ind):
-        if (selfInteraction):
-            results.append(pool.apply_async(loop_trajectory, args=(c[0], c[1], c[2], c[3],
-                                                               [cutoff, hbondcutoff, hbondcutangle],
-                                                               [bonds, name_array, resid_array, segids], selfInteraction)))
-        else:
-            results.append(pool.apply_async(loop_trajectory, args=(c[0], c[1], c[2], c[3],
-                                                               [cutoff, hbondcutoff, hbondcutangle],
-                                                               [bonds, name_array], selfInteraction)))
-        rank += 1
-    pool.close()
-    pool.join()
-    stop = time.time()
-    # print("time: ", str(stop-start), rank)
-    allContacts = []
-    for res in results:
-        rn = res.get()
-        # print(len(rn))
-        allContacts.extend(rn)
-    # pickle.dump(allContacts,open("parallel_results.dat","w"))
-    # print("frames: ", len(allContacts))
+    blockArgs = [(psf, dcd, b[0], b[-1] + 1, step, sel1text, sel2text, [cutoff, hbondcutoff, hbondcutangle])
+                 for b in blocks]
+    results, throughput = run_frame_blocks(pool, loop_trajectory, blockArgs, [len(b) for b in blocks],
+                                           progressChannel)
+    allContacts = ContactStore.concatenate(results)
+    if temporaryPool:
+        workerPool.close()
     return [allContacts, resname_array, resid_array, name_array, segids, backbone]
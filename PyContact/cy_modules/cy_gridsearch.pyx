@@ -1,4 +1,6 @@
 from cython.view cimport array as cvarray
+from libcpp.vector cimport vector
+from cython.parallel cimport prange
 import numpy as np
 
 cdef extern from "src/gridsearch.C":
@@ -7,6 +9,14 @@ cdef extern from "src/gridsearch.C":
 cdef extern from "src/gridsearch.C":
   int* find_within(const float *xyz, int *flgs, int *others, int num, float r)
 
+cdef extern from "src/gridsearch.C" nogil:
+  cdef cppclass ContactGrid:
+    pass
+  void build_contact_grid(const float *pos2, int n2, float cutoff, ContactGrid &grid)
+  void find_contacts_rows(const ContactGrid &grid, const float *pos1, int start, int stop, const float *pos2, float cutoff, int halfmatrix, vector[int] &ind1, vector[int] &ind2, vector[double] &dist)
+  void contact_weights(const double *dist, int n, double *weights)
+  void hbond_geometry(const float *donor, const float *hydrogen, const float *acceptor, int n, double *dist, double *angle)
+
 def cy_sasa(npcoords, natoms, pairdist, allow_double_counting, maxsize, nprad,
   surfacePoints, probeRadius, pointstyle,
   restricted,restrictedList):
@@ -22,3 +32,76 @@ def cy_find_within(xyz, flgs, others, num, r):
   cdef int [::1] cy_others = others
   cdef int[::1] result = <int[:num]> find_within(&cy_pos[0],&cy_flags[0], &cy_others[0], num, r)
   return np.asarray(result)
+
+def cy_find_contacts(pos1, pos2, cutoff, halfmatrix=False, int nthreads=1):
+  """Returns the indices and distances of all atom pairs between pos1 and pos2 within cutoff.
+
+    halfmatrix: pos2 is pos1, only the unique pairs (i < j) are searched
+    the search runs without the GIL, the rows of pos1 are split among nthreads threads (OpenMP)
+  """
+  cdef float [:, ::1] cy_pos1 = np.ascontiguousarray(pos1, dtype=np.float32)
+  cdef float [:, ::1] cy_pos2 = np.ascontiguousarray(pos2, dtype=np.float32)
+  cdef int n1 = cy_pos1.shape[0]
+  cdef int n2 = cy_pos2.shape[0]
+  cdef float cy_cutoff = cutoff
+  cdef int cy_half = 1 if halfmatrix else 0
+  if nthreads < 1 or n1 < nthreads:
+    nthreads = 1
+  # one result vector per thread, joined in row order
+  cdef vector[vector[int]] ind1
+  cdef vector[vector[int]] ind2
+  cdef vector[vector[double]] dist
+  ind1.resize(nthreads)
+  ind2.resize(nthreads)
+  dist.resize(nthreads)
+  cdef ContactGrid grid
+  cdef int t
+  if n1 > 0 and n2 > 0:
+    with nogil:
+      build_contact_grid(&cy_pos2[0, 0], n2, cy_cutoff, grid)
+      for t in prange(nthreads, num_threads=nthreads, schedule="static"):
+        find_contacts_rows(grid, &cy_pos1[0, 0], t * n1 // nthreads, (t + 1) * n1 // nthreads, &cy_pos2[0, 0],
+                           cy_cutoff, cy_half, ind1[t], ind2[t], dist[t])
+  cdef Py_ssize_t npairs = 0
+  for t in range(nthreads):
+    npairs += ind1[t].size()
+  idx1 = np.empty(npairs, dtype=np.intp)
+  idx2 = np.empty(npairs, dtype=np.intp)
+  distances = np.empty(npairs, dtype=np.float64)
+  cdef Py_ssize_t [::1] cy_idx1 = idx1
+  cdef Py_ssize_t [::1] cy_idx2 = idx2
+  cdef double [::1] cy_dist = distances
+  cdef Py_ssize_t i, k = 0
+  for t in range(nthreads):
+    for i in range(<Py_ssize_t> ind1[t].size()):
+      cy_idx1[k] = ind1[t][i]
+      cy_idx2[k] = ind2[t][i]
+      cy_dist[k] = dist[t][i]
+      k += 1
+  return idx1, idx2, distances
+
+def cy_contact_weights(distances):
+  """Scores the contact distances (cf. Analyzer.weight_function), computed without the GIL."""
+  cdef double [::1] cy_dist = np.ascontiguousarray(distances, dtype=np.float64)
+  weights = np.empty(cy_dist.shape[0], dtype=np.float64)
+  cdef double [::1] cy_weights = weights
+  cdef int n = cy_dist.shape[0]
+  if n > 0:
+    with nogil:
+      contact_weights(&cy_dist[0], n, &cy_weights[0])
+  return weights
+
+def cy_hbond_geometry(donorPos, hydrogenPos, acceptorPos):
+  """Returns the H...A distances and D-H...A angles (degrees) of the given positions, computed without the GIL."""
+  cdef float [:, ::1] cy_donor = np.ascontiguousarray(donorPos, dtype=np.float32)
+  cdef float [:, ::1] cy_hydrogen = np.ascontiguousarray(hydrogenPos, dtype=np.float32)
+  cdef float [:, ::1] cy_acceptor = np.ascontiguousarray(acceptorPos, dtype=np.float32)
+  cdef int n = cy_donor.shape[0]
+  distances = np.empty(n, dtype=np.float64)
+  angles = np.empty(n, dtype=np.float64)
+  cdef double [::1] cy_dist = distances
+  cdef double [::1] cy_angle = angles
+  if n > 0:
+    with nogil:
+      hbond_geometry(&cy_donor[0, 0], &cy_hydrogen[0, 0], &cy_acceptor[0, 0], n, &cy_dist[0], &cy_angle[0])
+  return distances, angles
@@ -167,6 +167,8 @@ class Canvas(QWidget, QObject):
                     rangedScores = hbarray
                 else:
                     rangedScores = hbarray[self.range[0]:self.range[1]]
+            # the paint loop reads every frame, the sparse series is expanded once per contact
+            rangedScores = rangedScores.tolist()
             if rownumber == 0:
                 # show the frame numbers on top
                 p.setFont(QFont('Arial', 8))
@@ -2,7 +2,7 @@ from __future__ import print_function
 
 from PyQt5.QtWidgets import QDialog, QGridLayout, QPushButton, QLabel, QLineEdit, QDialogButtonBox, QFileDialog, QCheckBox
 from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QDoubleValidator
+from PyQt5.QtGui import QDoubleValidator, QIntValidator
 
 from ..core.LoadConfiguration import Configuration
 from PyContact.core.ContactAnalyzer import Analyzer
@@ -90,6 +90,9 @@ class FileLoaderDialog(QDialog):
         cutoffHbondLabel = QLabel("acc-h cutoff: ")
         selection1Label = QLabel("selection 1: ")
         selection2Label = QLabel("selection 2: ")
+        startLabel = QLabel("start frame: ")
+        stopLabel = QLabel("stop frame: ")
+        stepLabel = QLabel("frame step: ")
 
         self.cutoffField = QLineEdit("5.0")
         posDoubleValidator = QDoubleValidator()
@@ -100,6 +103,18 @@ class FileLoaderDialog(QDialog):
         self.cutoffHbondField = QLineEdit("2.5")
         self.cutoffHbondField.setValidator(posDoubleValidator)
 
+        # empty fields: scan from the first to the last frame
+        posIntValidator = QIntValidator()
+        posIntValidator.setBottom(0)
+        self.startField = QLineEdit("")
+        self.startField.setValidator(posIntValidator)
+        self.stopField = QLineEdit("")
+        self.stopField.setValidator(posIntValidator)
+        self.stepField = QLineEdit("1")
+        stepValidator = QIntValidator()
+        stepValidator.setBottom(1)
+        self.stepField.setValidator(stepValidator)
+
         if production:
             self.selection1Field = QLineEdit("")
             self.selection2Field = QLineEdit("")
@@ -119,13 +134,20 @@ class FileLoaderDialog(QDialog):
         grid.addWidget(self.selection1Field, 4, 1)
         grid.addWidget(self.selection2Field, 5, 1)
 
+        grid.addWidget(startLabel, 6, 0)
+        grid.addWidget(stopLabel, 7, 0)
+        grid.addWidget(stepLabel, 8, 0)
+        grid.addWidget(self.startField, 6, 1)
+        grid.addWidget(self.stopField, 7, 1)
+        grid.addWidget(self.stepField, 8, 1)
+
         # OK and Cancel buttons
         buttons = QDialogButtonBox(
             QDialogButtonBox.Ok | QDialogButtonBox.Cancel,
             Qt.Horizontal, self)
         buttons.accepted.connect(self.accept)
         buttons.rejected.connect(self.reject)
-        grid.addWidget(buttons, 6, 0)
+        grid.addWidget(buttons, 9, 0)
 
     def pick_psf(self):
         """Pick topology file."""
@@ -145,9 +167,18 @@ class FileLoaderDialog(QDialog):
         """Returns the chosen configuration."""
         config = Configuration(self.psf, self.dcd, float(self.cutoffField.text()), float(self.cutoffHbondField.text()),
                                float(self.cutoffAngleField.text()), self.selection1Field.text(),
-                               self.selection2Field.text())
+                               self.selection2Field.text(), self.frameFieldValue(self.startField),
+                               self.frameFieldValue(self.stopField), self.frameFieldValue(self.stepField))
         return config
 
+    @staticmethod
+    def frameFieldValue(field):
+        """Returns the integer of a frame range field, None if it is empty."""
+        text = field.text()
+        if text == "":
+            return None
+        return int(text)
+
     @staticmethod
     def getConfig(parent=None):
         """Static method to create the dialog and return (date, time, accepted)."""
@@ -1,7 +1,6 @@
 from __future__ import print_function
 import multiprocessing
 import warnings
-import copy
 
 import PyQt5.QtCore as QtCore
 from PyQt5.QtCore import QRect, pyqtSlot, QObject
@@ -30,6 +29,7 @@ import Preferences
 from ..exampleData.datafiles import DEFAULTSESSION
 from VMDControlPanel import VMDControlPanel
 from ..core.DataHandler import DataHandler
+from ..core.contact_statistics import set_scores
 # from TableModels import *
 
 multiprocessing.log_to_stderr()
@@ -44,13 +44,25 @@ class MainWindow(QMainWindow, MainQtGui.Ui_MainWindow, QObject):
     def closeEvent(self, event):
         """Closing application when Exit on MainWindow is clicked."""
         print("Closing Application")
+        self.releaseAnalysis()
+        self.workerPool.close()
         event.accept()
         QApplication.quit()
 
+    def releaseAnalysis(self):
+        """Frees the shared memory of the current analysis before it is replaced."""
+        if self.analysis is not None:
+            self.analysis.releaseSharedContacts()
+
     def __init__(self, parent=None):
         self.config = None
         self.analysis = None
         self.maps = None
+        # worker processes shared by frame scan, accumulation and SASA computations of the session
+        self.workerPool = WorkerPool()
+        # reloading a trajectory with identical parameters reuses the previous frame scan,
+        # the files are identified by path, size and modification time, large trajectories are not hashed
+        self.scanCache = ScanCache(contentKeys=False)
         super(MainWindow, self).__init__(parent)
         self.contacts = []
         self.filteredContacts = []
@@ -100,6 +112,7 @@ class MainWindow(QMainWindow, MainQtGui.Ui_MainWindow, QObject):
         # setup of extra widgets
         self.exportWidget = ExportTabWidget()
         self.sasaView = SasaWidget()
+        self.sasaView.workerPool = self.workerPool
         self.statisticsView = None
 
         self.analysis_state = False
@@ -138,6 +151,7 @@ class MainWindow(QMainWindow, MainQtGui.Ui_MainWindow, QObject):
         self.sasaView.show()
         if self.analysis:
             self.sasaView.setFilePaths(self.analysis.getFilePaths())
+            self.sasaView.setFrameRange(*self.analysis.getFrameRange())
 
     def switchedToVisMode(self):
         """Switch to vis mode, to show selected contacts directly in VMD."""
@@ -182,11 +196,14 @@ class MainWindow(QMainWindow, MainQtGui.Ui_MainWindow, QObject):
             return
 
         self.contacts, arguments, trajArgs, self.maps, contactResults = DataHandler.importSessionFromFile(importfile)
+        self.releaseAnalysis()
         self.analysis = Analyzer(*arguments)
+        self.analysis.workerPool = self.workerPool
         self.analysis.contactResults = contactResults
         self.analysis.setTrajectoryData(*trajArgs)
         self.analysis.finalAccumulatedContacts = self.contacts
         self.sasaView.setFilePaths(*self.analysis.getFilePaths())
+        self.sasaView.setFrameRange(*self.analysis.getFrameRange())
         self.exportWidget.setFilePaths(*self.analysis.getFilePaths())
         self.updateSelectionLabels(arguments[5], arguments[6])
         self.updateSettings()
@@ -211,11 +228,14 @@ class MainWindow(QMainWindow, MainQtGui.Ui_MainWindow, QObject):
         """Loads the default session."""
         self.contacts, arguments, trajArgs, self.maps, contactResults = \
             DataHandler.importSessionFromFile(DEFAULTSESSION)
+        self.releaseAnalysis()
         self.analysis = Analyzer(*arguments)
+        self.analysis.workerPool = self.workerPool
         self.analysis.contactResults = contactResults
         self.analysis.setTrajectoryData(*trajArgs)
         self.analysis.finalAccumulatedContacts = self.contacts
         self.sasaView.setFilePaths(*self.analysis.getFilePaths())
+        self.sasaView.setFrameRange(*self.analysis.getFrameRange())
         self.exportWidget.setFilePaths(*self.analysis.getFilePaths())
         self.updateSelectionLabels(arguments[5], arguments[6])
         self.updateSettings()
@@ -228,8 +248,12 @@ class MainWindow(QMainWindow, MainQtGui.Ui_MainWindow, QObject):
             QApplication.processEvents()
             self.setInfoLabel("Loading trajectory and running atomic contact analysis...")
             nproc = int(self.settingsView.coreBox.value())
+            self.releaseAnalysis()
             self.analysis = Analyzer(self.config.psf, self.config.dcd, self.config.cutoff, self.config.hbondcutoff,
-                                     self.config.hbondcutangle, self.config.sel1text, self.config.sel2text)
+                                     self.config.hbondcutangle, self.config.sel1text, self.config.sel2text,
+                                     self.config.start, self.config.stop, self.config.step)
+            self.analysis.workerPool = self.workerPool
+            self.analysis.scanCache = self.scanCache
             QApplication.processEvents()
             try:
                 self.analysis.runFrameScan(nproc)
@@ -237,9 +261,11 @@ class MainWindow(QMainWindow, MainQtGui.Ui_MainWindow, QObject):
                 box = ErrorBox("Error while loading data: Probably you specified an atom selection with 0 atoms or invalid input files.")
                 box.exec_()
                 self.loadDataPushed()
-            self.setInfoLabel("%d frames loaded." % len(self.analysis.contactResults))
+            self.setInfoLabel("%d frames loaded%s." % (len(self.analysis.contactResults),
+                                                        " from cache" if self.analysis.scanCached else ""))
             self.updateSelectionLabels(self.config.sel1text, self.config.sel2text)
             self.sasaView.setFilePaths(*self.analysis.getFilePaths())
+            self.sasaView.setFrameRange(*self.analysis.getFrameRange())
             self.exportWidget.setFilePaths(*self.analysis.getFilePaths())
 
     @pyqtSlot(float)
@@ -327,7 +353,8 @@ class MainWindow(QMainWindow, MainQtGui.Ui_MainWindow, QObject):
                 lower = 0
             self.painter.range = [lower, upper]
             self.painter.rangeFilterActive = False
-            self.filteredContacts = copy.deepcopy(self.contacts)
+            # filters return new lists and views, self.contacts stays unchanged
+            self.filteredContacts = list(self.contacts)
             # residue range filter
             range_filter = RangeFilter("resrange")
             self.filteredContacts = range_filter.filterByRange(self.filteredContacts, self.residARangeField.text(),
@@ -350,8 +377,8 @@ class MainWindow(QMainWindow, MainQtGui.Ui_MainWindow, QObject):
                 self.painter.rangeFilterActive = True
                 frameRangeFilter = FrameFilter("framer")
                 self.filteredContacts = frameRangeFilter.extractFrameRange(self.filteredContacts, [lower, upper])
+            set_scores(self.filteredContacts)
             for c in self.filteredContacts:
-                c.setScores()
                 c.setContactType()
             # weight functions
             if weightActive:
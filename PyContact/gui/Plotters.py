@@ -11,6 +11,7 @@ import matplotlib
 
 from ..core.ContactFilters import *
 from ..core.Biochemistry import AccumulationMapIndex
+from ..core.contact_statistics import named_statistic
 from matplotlib import pyplot as plt
 plt.style.use('ggplot')
 
@@ -48,18 +49,14 @@ class ContactPlotter(MplPlotter):
     """Plots a frame-score plot with lines."""
 
     def plot_contact_figure(self, contact):
-        self.axes.plot(contact.scoreArray)
+        self.axes.plot(contact.scoreArray.toDense())
         self.axes.set_xlabel("frame")
         self.axes.set_ylabel("score")
 
     def plot_all_contacts_figure(self, contacts, smooth):
-        values = []
-
-        for frame in range(len(contacts[0].scoreArray)):
-            current = 0
-            for c in contacts:
-                current += c.scoreArray[frame]
-            values.append(current)
+        values = np.zeros(len(contacts[0].scoreArray))
+        for c in contacts:
+            np.add.at(values, c.scoreArray.frames, c.scoreArray.values)
         if smooth:
             val = self.savitzky_golay(np.array(values), smooth, 2)
             smaller = np.where(val < 0)
@@ -71,15 +68,10 @@ class ContactPlotter(MplPlotter):
         self.axes.set_ylabel("score")
 
     def plot_hbondNumber(self, contacts, smooth):
-        values = []
+        values = np.zeros(len(contacts[0].scoreArray))
         for c in contacts:
-            c.hbondFramesScan()
-
-        for frame in range(len(contacts[0].scoreArray)):
-            current = 0
-            for c in contacts:
-                current += c.hbondFrames[frame]
-            values.append(current)
+            hbondFrames = c.hbondFramesScan()
+            np.add.at(values, hbondFrames.frames, hbondFrames.values)
         if smooth:
             val = self.savitzky_golay(np.array(values), smooth, 2)
             smaller = np.where(val < 0)
@@ -128,20 +120,7 @@ class HistPlotter(MplPlotter):
     """Simple canvas with an histogram plot."""
 
     def plotGeneralHist(self, currentContacts, attribute, threshold, nsPerFrame):
-        values = []
-
-        if attribute == "Mean Score":
-            for c in currentContacts:
-                values.append(c.mean_score())
-        elif attribute == "Median Score":
-            for c in currentContacts:
-                values.append(c.median_score())
-        elif attribute == "Mean Lifetime":
-            for c in currentContacts:
-                values.append(c.mean_life_time(nsPerFrame, threshold))
-        elif attribute == "Median Lifetime":
-            for c in currentContacts:
-                values.append(c.median_life_time(nsPerFrame, threshold))
+        values = named_statistic(currentContacts, attribute, nsPerFrame, threshold)
 
         valuesNp = np.array(values, dtype=float)
         self.axes.hist(valuesNp, bins=20)
@@ -150,29 +129,8 @@ class HistPlotter(MplPlotter):
         self.fig.subplots_adjust(bottom=0.2, top=0.95, left=0.15, right=0.85)
 
     def plotContactHist(self, currentContacts, attribute, threshold, nsPerFrame, xticksfontsize):
-        values = []
-        titles = []
-
-        if attribute == "Mean Score":
-            for c in currentContacts:
-                values.append(c.mean_score())
-                titles.append(c.title)
-        elif attribute == "Median Score":
-            for c in currentContacts:
-                values.append(c.median_score())
-                titles.append(c.title)
-        elif attribute == "Mean Lifetime":
-            for c in currentContacts:
-                values.append(c.mean_life_time(nsPerFrame, threshold))
-                titles.append(c.title)
-        elif attribute == "Median Lifetime":
-            for c in currentContacts:
-                values.append(c.median_life_time(nsPerFrame, threshold))
-                titles.append(c.title)
-        elif attribute == "Hbond percentage":
-            for c in currentContacts:
-                values.append(c.hbond_percentage())
-                titles.append(c.title)
+        values = named_statistic(currentContacts, attribute, nsPerFrame, threshold)
+        titles = [c.title for c in currentContacts]
 
         valuesNp = np.array(values, dtype=float)
         titlesNp = np.array(titles, dtype=str)
@@ -210,31 +168,11 @@ class MapPlotter(MplPlotter):
         miny = np.min(minmaxresids2)
         data = np.zeros((len(y), len(x)))
 
-        if attribute == "Mean Score":
-            for c in contacts:
-                r1 = int(c.key1[AccumulationMapIndex.resid])-minx
-                r2 = int(c.key2[AccumulationMapIndex.resid])-miny
-                data[r2, r1] = c.mean_score()
-        elif attribute == "Median Score":
-            for c in contacts:
-                r1 = int(c.key1[AccumulationMapIndex.resid])-minx
-                r2 = int(c.key2[AccumulationMapIndex.resid])-miny
-                data[r2, r1] = c.median_score()
-        elif attribute == "Mean Lifetime":
-            for c in contacts:
-                r1 = int(c.key1[AccumulationMapIndex.resid])-minx
-                r2 = int(c.key2[AccumulationMapIndex.resid])-miny
-                data[r2, r1] = c.mean_life_time(nsPerFrame, threshold)
-        elif attribute == "Median Lifetime":
-            for c in contacts:
-                r1 = int(c.key1[AccumulationMapIndex.resid])-minx
-                r2 = int(c.key2[AccumulationMapIndex.resid])-miny
-                data[r2, r1] = c.median_life_time(nsPerFrame, threshold)
-        elif attribute == "Hbond percentage":
-            for c in contacts:
-                r1 = int(c.key1[AccumulationMapIndex.resid])-minx
-                r2 = int(c.key2[AccumulationMapIndex.resid])-miny
-                data[r2, r1] = c.hbond_percentage()
+        values = named_statistic(contacts, attribute, nsPerFrame, threshold)
+        for c, value in zip(contacts, values.tolist()):
+            r1 = int(c.key1[AccumulationMapIndex.resid])-minx
+            r2 = int(c.key2[AccumulationMapIndex.resid])-miny
+            data[r2, r1] = value
 
         cax = self.axes.matshow(data, cmap=cm.Greys, label=attribute)
 
@@ -300,6 +238,9 @@ class AnimateMapPlotter(MplPlotter):
         self.y = np.arange(np.min(self.minmaxresids2), np.max(self.minmaxresids2) + 1)
         self.minx = np.min(self.minmaxresids1)
         self.miny = np.min(self.minmaxresids2)
+        # map cell and dense score series of every contact, each animation frame reads one column
+        self.cells = (np.array(self.minmaxresids2) - self.miny, np.array(self.minmaxresids1) - self.minx)
+        self.frameScores = np.array([c.scoreArray.toDense() for c in contacts])
         rng = np.arange(len(contacts[0].scoreArray))
         self.cax = None
         self.ttl = self.axes.set_title("Map")
@@ -328,10 +269,7 @@ class AnimateMapPlotter(MplPlotter):
         print("frame: ", frame)
         attribute = "Mean Score"
         if attribute == "Mean Score":
-            for c in self.contacts:
-                r1 = int(c.key1[AccumulationMapIndex.resid]) - self.minx
-                r2 = int(c.key2[AccumulationMapIndex.resid]) - self.miny
-                data[r2, r1] = c.scoreArray[frame]
+            data[self.cells] = self.frameScores[:, frame]
         self.cax = self.axes.matshow(data, cmap=cm.Greys, label=self.attribute)
         self.ttl.set_text("Frame 0")
         if self.cb is None:
@@ -347,10 +285,7 @@ class AnimateMapPlotter(MplPlotter):
         data = np.zeros((len(self.y), len(self.x)))
         attribute = "Mean Score"
         if attribute == "Mean Score":
-            for c in self.contacts:
-                r1 = int(c.key1[AccumulationMapIndex.resid]) - self.minx
-                r2 = int(c.key2[AccumulationMapIndex.resid]) - self.miny
-                data[r2, r1] = c.scoreArray[frame]
+            data[self.cells] = self.frameScores[:, frame]
         self.cax.set_data(data)  # update the data
         self.ttl.set_text("Frame " + str(frame))
 
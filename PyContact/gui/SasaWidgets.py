@@ -13,25 +13,21 @@ from sasa_gui import *
 from ..core.multi_accumulation import chunks
 from ..core.Biochemistry import vdwRadius
 from ..core.LogPool import *
+from ..core.ProgressChannel import progressChannel
 from ..cy_modules import cy_gridsearch
 from Dialogues import TopoTrajLoaderDialog
 from ErrorBox import ErrorBox
 from ErrorMessages import ErrorMessages
 
-# manage processes for SASA
-sasaProgressManager = multiprocessing.Manager()
-sasaProgressDict = sasaProgressManager.dict()
 np.set_printoptions(threshold=np.inf)
 
 
 def calculate_sasa_parallel(input_coords, natoms, pairdist, nprad,
                             surfacePoints, probeRadius, pointstyle,
-                            restricted, restrictedList, rank):
+                            restricted, restrictedList):
     """Computes the SASA in parallel."""
 
     temp_sasa = []
-    frames_processed = 0
-    sasaProgressDict[rank] = frames_processed
     # print(len(input_coords))
     for c in input_coords:
         coords = np.reshape(c, (1, natoms * 3))
@@ -44,8 +40,7 @@ def calculate_sasa_parallel(input_coords, natoms, pairdist, nprad,
         # print("time for grid search: ", (stopC - startC))
         # print("asa:", asa)
         temp_sasa.append(asa)
-        frames_processed += 1
-        sasaProgressDict[rank] = frames_processed
+        progressChannel.frameDone()
     return temp_sasa
 
 
@@ -58,8 +53,12 @@ class SasaWidget(QWidget, Ui_SasaWidget):
         self.state = True
         self.name = None
         self.psf, self. dcd = "", ""
+        # frame range start:stop:step, as used for the contact analysis
+        self.start, self.stop, self.step = None, None, None
         self.allSasas = []
+        self.sasaFrames = []
         self.totalFramesToProcess = 0
+        self.workerPool = WorkerPool()
 
         sip.delete(self.sasaProgressBar)
         self.sasaProgressBar = PbWidget(total=100)
@@ -82,17 +81,24 @@ class SasaWidget(QWidget, Ui_SasaWidget):
         self.psf = argv[0][0]
         self.dcd = argv[0][1]
 
+    def setFrameRange(self, start=None, stop=None, step=None):
+        """Restricts the SASA computation to the frames start:stop:step."""
+        self.start, self.stop, self.step = start, stop, step
+
     def loadData(self):
         """Sets the chosen trajectory and topology paths."""
         loadedData = self.topoloader.getConfig()
         self.psf = loadedData[0][0]
         self.dcd = loadedData[0][1]
+        self.setFrameRange()
 
     def clearData(self):
         """Clears the whole view and sets it to the initial state."""
         self.psf = ""
         self.dcd = ""
+        self.setFrameRange()
         self.allSasas = []
+        self.sasaFrames = []
         self.totalFramesToProcess = 0
         self.sasaProgressBar.setProperty("value", 0)
         sip.delete(self.previewPlot)
@@ -128,7 +134,7 @@ class SasaWidget(QWidget, Ui_SasaWidget):
 
             f = open(path + file_extension, "w")
             for i in range(self.totalFramesToProcess):
-                f.write(str(i) + "\t" + str(self.allSasas[i]) + "\n")
+                f.write(str(self.sasaFrames[i]) + "\t" + str(self.allSasas[i]) + "\n")
             f.close()
 
     def calculateSasa(self):
@@ -194,30 +200,27 @@ class SasaWidget(QWidget, Ui_SasaWidget):
         # TODO: bug if selection is not static for all frames
         # TODO: dynamic allocation of positions in every frame!
         input_coords = []
-        for ts in u.trajectory:
+        self.sasaFrames = []
+        # skipped frames are never read
+        for ts in u.trajectory[self.start:self.stop:self.step]:
+            self.sasaFrames.append(ts.frame)
             # ressel = u.select_atoms(resseltext)
             # print("restricted: ", len(ressel.atoms))
             input_coords.append(selection.positions)
 
         nprocs = self.coreBox.value()
         input_chunks = chunks(input_coords, nprocs)
-        pool = LoggingPool(nprocs)
+        pool = self.workerPool.get(nprocs)
         results = []
-        rank = 0
-        trajLength = len(u.trajectory)
+        trajLength = len(self.sasaFrames)
         self.totalFramesToProcess = trajLength
+        progressChannel.reset(trajLength, self.updateSasaProgress)
         for input_coords_chunk in input_chunks:
             results.append(pool.apply_async(calculate_sasa_parallel, args=(input_coords_chunk, natoms, pairdist, nprad,
                                                                            surfacePoints, probeRadius, pointstyle,
-                                                                           restricted, restrictedList, rank)))
-            rank += 1
-        print("ranks", rank)
-        self.state = True
-        self.sasaEventListener()
-        pool.close()
-        pool.join()
+                                                                           restricted, restrictedList)))
+        progressChannel.wait(results)
 
-        self.state = False
         for r in results:
             self.allSasas.extend(r.get())
 
@@ -246,26 +249,20 @@ class SasaWidget(QWidget, Ui_SasaWidget):
             restrictedList2 = np.array(restrictedList2, dtype=np.int32)
 
             input_coords2 = []
-            for ts in u.trajectory:
+            for ts in u.trajectory[self.start:self.stop:self.step]:
                 input_coords2.append(selection2.positions)
 
             input_chunks2 = chunks(input_coords2, nprocs)
-            pool = LoggingPool(nprocs)
+            pool = self.workerPool.get(nprocs)
             results = []
-            rank = 0
-            trajLength = len(u.trajectory)
+            trajLength = len(self.sasaFrames)
             self.totalFramesToProcess = trajLength
+            progressChannel.reset(trajLength, self.updateSasaProgress)
             for input_coords_chunk2 in input_chunks2:
                 results.append(pool.apply_async(calculate_sasa_parallel, args=(input_coords_chunk2, natoms2, pairdist,
                                                                                nprad, surfacePoints, probeRadius,
-                                                                               pointstyle, restricted, restrictedList2,
-                                                                               rank)))
-                rank += 1
-            print("ranks", rank)
-            self.state = True
-            self.sasaEventListener()
-            pool.close()
-            pool.join()
+                                                                               pointstyle, restricted, restrictedList2)))
+            progressChannel.wait(results)
 
             all_sasas2 = []
             for r in results:
@@ -278,7 +275,7 @@ class SasaWidget(QWidget, Ui_SasaWidget):
 
         sip.delete(self.previewPlot)
         self.previewPlot = SimplePlotter(None, width=4, height=2, dpi=70)
-        self.previewPlot.plot(np.arange(0, trajLength, 1), self.allSasas)
+        self.previewPlot.plot(np.array(self.sasaFrames), self.allSasas)
         self.previewPlot.axes.set_xlabel("frame")
         if self.calculateContactAreaCheckbox.isChecked():
             self.previewPlot.axes.set_ylabel(r'Contact Area [A$^{\circ}$$^{2}$]')
@@ -287,26 +284,10 @@ class SasaWidget(QWidget, Ui_SasaWidget):
         self.graphGridLayout.addWidget(self.previewPlot)
         self.previewPlot.update()
 
-    def sasaEventListener(self):
-        """Event listener for progress bar updates."""
-        while self.state:
-            QApplication.processEvents()
-            progress = 0
-            for each in sasaProgressDict.keys():
-                progress += sasaProgressDict[each]
-                # sasaProgressDict[each] = 0
-            progress = float(progress) / float(self.totalFramesToProcess) * 100
-            # if (101 - self.sasaProgressBar.value()) < progress:
-            #     self.sasaProgressBar.update_bar(101 - self.sasaProgressBar.value())
-            if progress > 0:
-                self.sasaProgressBar.setValue(progress)
-
-            if int(progress) == 100:
-                # print("finished")
-                for each in sasaProgressDict.keys():
-                    sasaProgressDict[each] = 0
-                # progress = 0
-                self.state = False
+    def updateSasaProgress(self, fraction):
+        """Progress bar update, called by the progress channel at a limited rate."""
+        self.sasaProgressBar.setValue(fraction * 100)
+        QApplication.processEvents()
 
 
 class PbWidget(QProgressBar):
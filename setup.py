@@ -1,14 +1,18 @@
 """ pycontact setup
 by Maximilian Scheurer, Peter Rodenkirch
 """
+import sys
 from setuptools import setup, find_packages
 from setuptools.extension import Extension
 from Cython.Distutils import build_ext
 from Cython.Build import cythonize
 
+# the contact search kernel is multithreaded with OpenMP, it runs single threaded without it
+openmp = ["-fopenmp"] if sys.platform.startswith("linux") else []
 extensions = [Extension("PyContact.cy_modules.cy_gridsearch",
                         ["PyContact/cy_modules/cy_gridsearch.pyx"], language="c++",
-                        include_dirs=[".", "PyContact/cy_modules/src"]), ]
+                        include_dirs=[".", "PyContact/cy_modules/src"],
+                        extra_compile_args=openmp, extra_link_args=openmp), ]
 setup(
     name='pycontact',
     version='1.0',
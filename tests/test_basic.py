@@ -1,6 +1,9 @@
 from unittest import TestCase
+import os
+import shutil
 import sys
-from os import path
+import tempfile
+from os import path, listdir
 from PyContact.core.ContactAnalyzer import *
 from PyContact.exampleData.datafiles import DCD, PSF, TPR, XTC
 import MDAnalysis as mda
@@ -9,7 +12,31 @@ sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
 # from PyContact.core.multi_trajectory import run_load_parallel
 
 
+def count_frames(nframes):
+    """Reports nframes processed frames, used as pool task."""
+    progressChannel.frameDone(nframes)
+
+
 class PsfDcdReadingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # the topology and scan caches are written to a temporary directory instead of ~/.pycontact
+        cls.cacheDir = tempfile.mkdtemp()
+        cls.previousCache = os.environ.get("PYCONTACT_CACHE")
+        os.environ["PYCONTACT_CACHE"] = cls.cacheDir
+        # frame scan shared by the tests that only read it
+        cls.scanned = Analyzer(PSF, DCD, 5.0, 2.5, 120, "segid RN11", "segid UBQ")
+        cls.scanned.runFrameScan(1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.scanned.workerPool.close()
+        if cls.previousCache is None:
+            del os.environ["PYCONTACT_CACHE"]
+        else:
+            os.environ["PYCONTACT_CACHE"] = cls.previousCache
+        shutil.rmtree(cls.cacheDir, True)
+
     def setUp(self):
         self.dcdfile = DCD
         self.psffile = PSF
@@ -87,8 +114,389 @@ class PsfDcdReadingTest(TestCase):
             hbond_sum += c.hbond_percentage()
         self.assertEqual(hbond_sum, 676.0)
 
+    def test_worker_pool_reuse(self):
+        analyzer = Analyzer(self.psffile, self.dcdfile, 5.0, 2.5, 120, "segid RN11", "segid UBQ")
+        analyzer.runFrameScan(2)
+        pool = analyzer.workerPool.pool
+        analyzer.runContactAnalysis([0, 0, 1, 1, 0], [0, 0, 1, 1, 0], 2)
+        self.assertEqual(len(analyzer.finalAccumulatedContacts), 148)
+        analyzer.runContactAnalysis([0, 0, 0, 1, 0], [0, 0, 0, 1, 0], 2)
+        self.assertIs(analyzer.workerPool.pool, pool)
+        analyzer.workerPool.close()
+        self.assertIsNone(analyzer.workerPool.pool)
+
     def test_around_selection_patch(self):
         univ = mda.Universe(self.psffile, self.dcdfile)
         aroundText = "segid UBQ and around 5 segid RN11"
         sel = univ.select_atoms(aroundText)
         self.assertEqual(len(sel), 261)
+
+    def test_dynamic_around_selection(self):
+        from PyContact.core.aroundPatch import DynamicSelection
+        univ = mda.Universe(self.psffile, self.dcdfile)
+        aroundText = "segid UBQ and around 5 segid RN11"
+        dynamic = DynamicSelection(univ, aroundText)
+        for ts in univ.trajectory:
+            self.assertTrue(np.array_equal(dynamic.update().indices, univ.select_atoms(aroundText).indices))
+
+    def test_sparse_contact_search(self):
+        from MDAnalysis.analysis import distances
+        from PyContact.cy_modules import cy_gridsearch
+        univ = mda.Universe(self.psffile, self.dcdfile)
+        pos1 = univ.select_atoms("segid RN11").positions
+        pos2 = univ.select_atoms("segid UBQ").positions
+        idx1, idx2, dist = cy_gridsearch.cy_find_contacts(pos1, pos2, 5.0)
+        distarray = distances.distance_array(pos1, pos2, box=None)
+        contacts = np.where(distarray <= 5.0)
+        self.assertTrue(np.array_equal(idx1, contacts[0]))
+        self.assertTrue(np.array_equal(idx2, contacts[1]))
+        self.assertTrue(np.allclose(dist, distarray[contacts]))
+
+    def test_half_matrix_self_search(self):
+        from PyContact.cy_modules import cy_gridsearch
+        univ = mda.Universe(self.psffile, self.dcdfile)
+        pos = univ.select_atoms("segid RN11").positions
+        full1, full2, fulldist = cy_gridsearch.cy_find_contacts(pos, pos, 5.0)
+        idx1, idx2, dist = cy_gridsearch.cy_find_contacts(pos, pos, 5.0, True)
+        upper = full1 < full2
+        self.assertTrue(np.array_equal(idx1, full1[upper]))
+        self.assertTrue(np.array_equal(idx2, full2[upper]))
+        self.assertTrue(np.array_equal(dist, fulldist[upper]))
+
+    def test_threaded_frame_scan(self):
+        from PyContact.cy_modules import cy_gridsearch
+        univ = mda.Universe(self.psffile, self.dcdfile)
+        pos = univ.select_atoms("segid UBQ").positions
+        single = cy_gridsearch.cy_find_contacts(pos, pos, 5.0, True, 1)
+        multi = cy_gridsearch.cy_find_contacts(pos, pos, 5.0, True, 3)
+        for a, b in zip(single, multi):
+            self.assertTrue(np.array_equal(a, b))
+        serial = self.scanned
+        threaded = Analyzer(self.psffile, self.dcdfile, 5.0, 2.5, 120, "segid RN11", "segid UBQ")
+        threaded.runFrameScan(3, threads=True)
+        self.assertTrue(np.array_equal(serial.contactResults.offsets, threaded.contactResults.offsets))
+        self.assertTrue(np.array_equal(serial.contactResults.contacts, threaded.contactResults.contacts))
+        self.assertTrue(np.array_equal(serial.contactResults.hbonds, threaded.contactResults.hbonds))
+        # a single frame, all threads go to the pair search
+        oneFrame = Analyzer(self.psffile, self.dcdfile, 5.0, 2.5, 120, "segid RN11", "segid UBQ", 0, 1)
+        oneFrame.runFrameScan(3, threads=True)
+        self.assertTrue(np.array_equal(serial.contactResults[0:1].contacts, oneFrame.contactResults.contacts))
+        self.assertTrue(np.array_equal(serial.contactResults[0:1].hbonds, oneFrame.contactResults.hbonds))
+
+    def test_frame_scheduler(self):
+        from PyContact.core.frame_scheduler import frame_blocks, run_frame_blocks
+        blocks = frame_blocks(list(range(50)), 2)
+        self.assertEqual(sum(blocks, []), list(range(50)))
+        self.assertEqual(len(blocks), 13)
+        pool = LoggingPool(2)
+        results, throughput = run_frame_blocks(pool, sum, [(b,) for b in blocks], [len(b) for b in blocks])
+        pool.close()
+        pool.join()
+        self.assertEqual(results, [sum(b) for b in blocks])
+        self.assertEqual(sum(frames for frames, busy in throughput.values()), 50)
+
+    def test_progress_channel(self):
+        from PyContact.core.frame_scheduler import frame_blocks, run_frame_blocks
+        from PyContact.core.ProgressChannel import progressChannel
+        updates = []
+        progressChannel.reset(40, updates.append)
+        pool = LoggingPool(2)
+        blocks = frame_blocks(list(range(40)), 2)
+        run_frame_blocks(pool, count_frames, [(len(b),) for b in blocks], [len(b) for b in blocks], progressChannel)
+        pool.close()
+        pool.join()
+        self.assertEqual(progressChannel.counter.value, 40)
+        self.assertEqual(updates[-1], 1.0)
+
+    def test_topology_cache(self):
+        from PyContact.core.Topology import Topology, file_hash
+        univ = mda.Universe(self.psffile, self.dcdfile)
+        cacheDir = tempfile.mkdtemp()
+        try:
+            extracted = Topology.load(self.psffile, univ, cacheDir)
+            self.assertEqual(len(listdir(cacheDir)), 1)
+            cached = Topology.load(self.psffile, univ, cacheDir)
+            self.assertEqual(listdir(cacheDir)[0].split("_")[0], file_hash(self.psffile))
+            self.assertEqual(file_hash(self.psffile), Topology.fileHash(self.psffile))
+        finally:
+            shutil.rmtree(cacheDir)
+        self.assertEqual(list(cached.nameArray()), [atom.name for atom in univ.atoms])
+        self.assertEqual(list(cached.segidArray()), [atom.segid for atom in univ.atoms])
+        self.assertEqual(list(cached.resids), [atom.resid for atom in univ.atoms])
+        self.assertEqual(list(cached.backbone), list(univ.select_atoms("backbone").indices))
+        for a, b in zip(extracted.trajectoryData() + extracted.hbondTopology()[1:],
+                        cached.trajectoryData() + cached.hbondTopology()[1:]):
+            self.assertTrue(np.array_equal(a, b))
+
+    def test_topology_cache_invalidation(self):
+        from PyContact.core.Topology import Topology
+        univ = mda.Universe(self.psffile, self.dcdfile)
+        cacheDir = tempfile.mkdtemp()
+        try:
+            topologyFile = path.join(cacheDir, "topology.psf")
+            shutil.copy(self.psffile, topologyFile)
+            Topology.load(topologyFile, univ, cacheDir)
+            Topology.load(topologyFile, univ, cacheDir)
+            self.assertEqual(len([f for f in listdir(cacheDir) if f.endswith(".npz")]), 1)
+            with open(topologyFile, "a") as f:
+                f.write("\n")
+            Topology.load(topologyFile, univ, cacheDir)
+            self.assertEqual(len([f for f in listdir(cacheDir) if f.endswith(".npz")]), 2)
+        finally:
+            shutil.rmtree(cacheDir)
+
+    def test_cache_directory_override(self):
+        from PyContact.core.Topology import Topology, defaultCacheDir
+        univ = mda.Universe(self.psffile, self.dcdfile)
+        cacheDir = tempfile.mkdtemp()
+        os.environ["PYCONTACT_CACHE"] = cacheDir
+        try:
+            self.assertEqual(defaultCacheDir(), path.join(cacheDir, "topology"))
+            Topology.load(self.psffile, univ)
+            self.assertEqual(len(listdir(defaultCacheDir())), 1)
+        finally:
+            os.environ["PYCONTACT_CACHE"] = self.cacheDir
+            shutil.rmtree(cacheDir)
+
+    def test_scan_cache(self):
+        cache = ScanCache(tempfile.mkdtemp())
+        try:
+            analyzer = Analyzer(self.psffile, self.dcdfile, 5.0, 2.5, 120, "segid RN11", "segid UBQ")
+            analyzer.scanCache = cache
+            analyzer.runFrameScan(1)
+            self.assertFalse(analyzer.scanCached)
+            self.assertEqual(len(listdir(cache.directory)), 1)
+            cached = Analyzer(self.psffile, self.dcdfile, 5.0, 2.5, 120, "segid RN11", "segid UBQ")
+            cached.scanCache = cache
+            cached.runFrameScan(1)
+            self.assertTrue(cached.scanCached)
+            self.assertTrue(np.array_equal(cached.contactResults.contacts, self.scanned.contactResults.contacts))
+            self.assertTrue(np.array_equal(cached.contactResults.hbonds, self.scanned.contactResults.hbonds))
+            cached.runContactAnalysis([0, 0, 1, 1, 0], [0, 0, 1, 1, 0], 1)
+            self.assertEqual(len(cached.finalAccumulatedContacts), 148)
+            other = Analyzer(self.psffile, self.dcdfile, 4.0, 2.5, 120, "segid RN11", "segid UBQ")
+            other.scanCache = cache
+            other.runFrameScan(1)
+            self.assertEqual(len(listdir(cache.directory)), 2)
+            cache.maxSize = 0
+            cache.evict()
+            self.assertEqual(len(listdir(cache.directory)), 0)
+        finally:
+            shutil.rmtree(cache.directory)
+        # keys from file metadata, the trajectory is not read
+        versions = ScanCache(contentKeys=False)
+        self.assertEqual(versions.key(self.psffile, self.dcdfile, 5.0, 2.5, 120, "segid RN11", "segid UBQ"),
+                         versions.key(self.psffile, self.dcdfile, 5.0, 2.5, 120, "segid RN11", "segid UBQ"))
+        self.assertNotEqual(versions.key(self.psffile, self.dcdfile, 5.0, 2.5, 120, "segid RN11", "segid UBQ"),
+                            cache.key(self.psffile, self.dcdfile, 5.0, 2.5, 120, "segid RN11", "segid UBQ"))
+
+    def test_cutoff_derivation(self):
+        analyzer = Analyzer(self.psffile, self.dcdfile, 5.0, 2.5, 120, "segid RN11", "self")
+        analyzer.runFrameScan(1)
+        for cutoff in [3.7, 4.0, 4.5]:
+            scanned = Analyzer(self.psffile, self.dcdfile, cutoff, 2.5, 120, "segid RN11", "self")
+            scanned.runFrameScan(1)
+            derived = analyzer.withCutoff(cutoff)
+            self.assertTrue(np.array_equal(derived.contactResults.offsets, scanned.contactResults.offsets))
+            self.assertTrue(np.array_equal(derived.contactResults.contacts, scanned.contactResults.contacts))
+            self.assertTrue(np.array_equal(derived.contactResults.hbonds, scanned.contactResults.hbonds))
+        self.assertRaises(ValueError, analyzer.withCutoff, 6.0)
+
+    def test_hbond_criteria_derivation(self):
+        analyzer = self.scanned
+        for hbondcutoff, hbondcutangle in [(3.0, 100), (2.0, 150)]:
+            scanned = Analyzer(self.psffile, self.dcdfile, 5.0, hbondcutoff, hbondcutangle, "segid RN11", "segid UBQ")
+            scanned.runFrameScan(1)
+            derived = analyzer.withHbondCriteria(hbondcutoff, hbondcutangle)
+            self.assertTrue(np.array_equal(derived.contactResults.contacts, scanned.contactResults.contacts))
+            self.assertTrue(np.array_equal(derived.contactResults.hbonds, scanned.contactResults.hbonds))
+        self.assertGreater(len(analyzer.withHbondCriteria(3.0, 100).contactResults.hbonds),
+                           len(analyzer.contactResults.hbonds))
+        self.assertRaises(ValueError, analyzer.withHbondCriteria, 4.0, 120)
+
+    def test_accumulation_group_ids(self):
+        analyzer = self.scanned
+        trajectoryData = analyzer.getTrajectoryData()
+        residueMap, segmentMap = [0, 0, 1, 1, 0], [0, 0, 0, 0, 1]
+        groups1, groups2 = group_ids(trajectoryData, residueMap), group_ids(trajectoryData, segmentMap)
+        univ = mda.Universe(self.psffile, self.dcdfile)
+        self.assertEqual(len(groups1[1]), len(set(zip(univ.atoms.resids, univ.atoms.resnames))))
+        self.assertEqual(len(groups2[1]), len(set(univ.atoms.segids)))
+        contacts = analyzer.contactResults.contacts
+        keys = contact_keys(contacts["idx1"], contacts["idx2"], groups1, groups2)
+        for key, cont in zip(keys[:100], contacts[:100]):
+            key1, key2 = key_arrays(key, trajectoryData, residueMap, segmentMap, groups1, groups2)
+            self.assertEqual(key1, key_array(trajectoryData, residueMap, cont["idx1"]))
+            self.assertEqual(key2, ["none", "none", "none", "none", str(analyzer.segids[cont["idx2"]])])
+
+    def test_score_matrix(self):
+        from PyContact.core.ScoreMatrix import ScoreMatrix
+        analyzer = self.scanned
+        store = analyzer.contactResults
+        trajectoryData = analyzer.getTrajectoryData()
+        residueMap = [0, 0, 1, 1, 0]
+        groups = group_ids(trajectoryData, residueMap)
+        keys = contact_keys(store.contacts["idx1"], store.contacts["idx2"], groups, groups)
+        isBackbone = backbone_mask(trajectoryData)
+        self.assertEqual(set(np.flatnonzero(isBackbone)), set(analyzer.backbone))
+        matrix = ScoreMatrix.fromStore(store, keys, isBackbone)
+        self.assertEqual(len(matrix), len(np.unique(keys)))
+        self.assertEqual(matrix.indptr[-1], len(matrix.scores))
+        self.assertAlmostEqual(matrix.scores.sum(), store.contacts["weight"].sum())
+        self.assertAlmostEqual((matrix.bb1 + matrix.sc1).sum(), store.contacts["weight"].sum())
+        self.assertEqual(matrix.hbondCounts.sum(), len(store.hbonds))
+        joined = ScoreMatrix.concatenate([ScoreMatrix.fromStore(store[0:20], keys[:store.offsets[20]],
+                                                                isBackbone),
+                                          ScoreMatrix.fromStore(store[20:50], keys[store.offsets[20]:],
+                                                                isBackbone)])
+        self.assertTrue(np.array_equal(joined.keys, matrix.keys))
+        self.assertTrue(np.allclose(joined.scores, matrix.scores))
+        self.assertTrue(np.array_equal(joined.hbondCounts, matrix.hbondCounts))
+        self.assertTrue(np.allclose(joined.sc2, matrix.sc2))
+        empty = ScoreMatrix.concatenate([])
+        self.assertEqual((len(empty), empty.numberOfFrames, len(empty.scores)), (0, 0, 0))
+        noFrames = analyzer.derivedAnalyzer(5.0, 2.5, 120, store[0:0])
+        self.assertEqual(noFrames.runContactAnalysis([0, 0, 1, 1, 0], [0, 0, 1, 1, 0], 2), [])
+
+    def test_multi_map_analysis(self):
+        analyzer = self.scanned
+        mapPairs = [([1, 1, 1, 1, 0], [1, 1, 1, 1, 0]), ([0, 0, 1, 1, 0], [0, 0, 1, 1, 0]),
+                    ([0, 0, 0, 0, 1], [0, 0, 0, 1, 1])]
+        for nproc in [1, 2]:
+            results = analyzer.runMultiContactAnalysis(mapPairs, nproc)
+            for (map1, map2), contacts in zip(mapPairs, results):
+                reference = dict((c.title, c) for c in analyzer.runContactAnalysis(map1, map2, 1))
+                self.assertEqual(len(contacts), len(reference))
+                for c in contacts:
+                    self.assertTrue(np.allclose(c.scoreArray, reference[c.title].scoreArray))
+                    self.assertAlmostEqual(c.sc1, reference[c.title].sc1)
+                    self.assertEqual(c.hbond_percentage(), reference[c.title].hbond_percentage())
+                    self.assertEqual(sum(len(f) for f in c.contributingAtoms),
+                                     sum(len(f) for f in reference[c.title].contributingAtoms))
+
+    def test_result_views(self):
+        from PyContact.core.ContactFilters import FrameFilter
+        analyzer = self.scanned
+        contacts = analyzer.runContactAnalysis([0, 0, 1, 1, 0], [0, 0, 1, 1, 0], 1)
+        for c, final in zip(contacts, analyzer.finalAccumulatedContacts):
+            self.assertIsNot(c, final)
+            self.assertIs(c.scoreArray, final.scoreArray)
+            self.assertIs(c.contributingAtoms, final.contributingAtoms)
+        ranged = FrameFilter("framer").extractFrameRange(contacts, [10, 20])
+        self.assertEqual(len(ranged[0].scoreArray), 10)
+        self.assertEqual(len(ranged[0].contributingAtoms), 10)
+        self.assertEqual(len(contacts[0].scoreArray), 50)
+        self.assertEqual(len(contacts[0].hbondFrameCounts), 50)
+
+    def test_contributing_atoms(self):
+        analyzer = self.scanned
+        contacts = analyzer.runContactAnalysis([0, 0, 0, 0, 1], [0, 0, 0, 0, 1], 1)
+        self.assertEqual(len(contacts), 1)
+        atoms = contacts[0].contributingAtoms
+        self.assertEqual(atoms.numberOfContacts(), analyzer.contactResults.numberOfContacts)
+        frame = analyzer.contactResults[7]
+        self.assertEqual([(c.idx1, c.idx2, len(c.hbondinfo)) for c in atoms[7]],
+                         [(c.idx1, c.idx2, len(c.hbondinfo)) for c in frame])
+        self.assertEqual(len(atoms[5:10]), 5)
+        self.assertEqual(len(atoms[5:10][2]), len(frame))
+
+    def test_contact_statistics(self):
+        from PyContact.core import contact_statistics
+        analyzer = self.scanned
+        contacts = analyzer.runContactAnalysis([0, 0, 1, 1, 0], [0, 0, 1, 1, 0], 1)
+        self.assertTrue(np.allclose(contact_statistics.mean_scores(contacts), [c.mean_score() for c in contacts]))
+        self.assertTrue(np.allclose(contact_statistics.median_scores(contacts),
+                                    [np.median(c.scoreArray.toDense()) for c in contacts]))
+        self.assertTrue(np.allclose(contact_statistics.hbond_percentages(contacts),
+                                    [c.hbond_percentage() for c in contacts]))
+        for threshold in [0, 0.5, -1]:
+            self.assertTrue(np.allclose(contact_statistics.total_times(contacts, 0.1, threshold),
+                                        [c.total_time(0.1, threshold) for c in contacts]))
+            self.assertTrue(np.allclose(contact_statistics.mean_life_times(contacts, 0.1, threshold),
+                                        [c.mean_life_time(0.1, threshold) for c in contacts]))
+            self.assertTrue(np.allclose(contact_statistics.median_life_times(contacts, 0.1, threshold),
+                                        [c.median_life_time(0.1, threshold) for c in contacts]))
+
+    def test_sparse_series(self):
+        from PyContact.core.SparseSeries import SparseSeries
+        dense = np.array([0, 0.5, 0.7, 0, 0, 1.2, 0, 0.1, 0.3, 0])
+        series = SparseSeries.fromDense(dense)
+        self.assertEqual(len(series.values), 5)
+        self.assertEqual(list(series), dense.tolist())
+        self.assertEqual(series[5], 1.2)
+        self.assertEqual(series[-1], 0)
+        self.assertEqual(list(series[2:8]), dense[2:8].tolist())
+        self.assertAlmostEqual(series.mean(), np.mean(dense))
+        self.assertEqual(series.median(), np.median(dense))
+        self.assertEqual(series[1:].median(), np.median(dense[1:]))
+        self.assertEqual(series.countAbove(0.2), 4)
+        starts, lengths = series.runsAbove(0.2)
+        self.assertEqual(starts.tolist(), [1, 5, 8])
+        self.assertEqual(lengths.tolist(), [2, 1, 1])
+        contact = AccumulatedContact(["none"] * 5, ["none"] * 5)
+        contact.scoreArray = series
+        self.assertEqual(contact.life_time(1, 0.2), [2, 1, 1, 0])
+        self.assertEqual(contact.total_time(1, -1), 10)
+        appended = SparseSeries()
+        for value in dense:
+            appended.append(value)
+        self.assertEqual(appended.tolist(), dense.tolist())
+        view = series[0:4]
+        view.append(2.0)
+        self.assertEqual(view.tolist(), [0, 0.5, 0.7, 0, 2.0])
+        self.assertEqual(list(series), dense.tolist())
+
+    def test_contact_store(self):
+        from PyContact.core.ContactStore import ContactStore, shared_memory_dir
+        analyzer = self.scanned
+        store = analyzer.contactResults
+        converted = ContactStore.fromAtomContacts(list(store), 2.5, 120)
+        self.assertTrue(np.array_equal(converted.contacts, store.contacts))
+        self.assertTrue(np.array_equal(converted.offsets, store.offsets))
+        self.assertTrue(np.array_equal(converted.hbonds, store.hbonds))
+        joined = ContactStore.concatenate([store[0:20], store[20:50]])
+        self.assertTrue(np.array_equal(joined.contacts, store.contacts))
+        self.assertTrue(np.array_equal(joined.hbonds, store.hbonds))
+        self.assertEqual(len(store[-1]), store.frameRows(49)[1] - store.frameRows(49)[0])
+        directory = tempfile.mkdtemp()
+        store.share(directory)
+        shared = ContactStore.attach(directory)
+        self.assertTrue(np.array_equal(shared.contacts, store.contacts))
+        self.assertTrue(np.array_equal(shared.hbonds, store.hbonds))
+        self.assertEqual(shared.envelope, store.envelope)
+        shutil.rmtree(directory)
+        derived = analyzer.derivedAnalyzer(5.0, 2.5, 120, store)
+        sharedDirectory = derived.sharedContactResults()
+        self.assertEqual(derived.sharedContactResults(), sharedDirectory)
+        store.modified()
+        self.assertNotEqual(derived.sharedContactResults(), sharedDirectory)
+        self.assertFalse(path.exists(sharedDirectory))
+        sharedDirectory = derived.sharedContactResults()
+        derived.contactResults = store[0:10]
+        self.assertFalse(path.exists(sharedDirectory))
+        # tables that do not fit into /dev/shm are shared from the temp dir
+        self.assertIsNone(shared_memory_dir(1 << 60))
+
+    def test_frame_range(self):
+        analyzer = Analyzer(self.psffile, self.dcdfile, 5.0, 2.5, 120, "segid RN11", "segid UBQ", step=10)
+        analyzer.runFrameScan(1)
+        self.assertEqual(len(analyzer.contactResults), 5)
+        self.assertEqual(sorted(set(analyzer.contactResults.contacts["frame"])), [0, 10, 20, 30, 40])
+        parallel = Analyzer(self.psffile, self.dcdfile, 5.0, 2.5, 120, "segid RN11", "segid UBQ", 5, 45, 10)
+        parallel.runFrameScan(2)
+        self.assertEqual(len(parallel.contactResults), 4)
+        self.assertTrue(np.array_equal(parallel.contactResults.contacts["frame"][:3], [5, 5, 5]))
+
+    def test_streaming_analysis(self):
+        analyzer = Analyzer(self.psffile, self.dcdfile, 5.0, 2.5, 120, "segid RN11", "segid UBQ")
+        map1 = [0, 0, 1, 1, 0]
+        map2 = [0, 0, 1, 1, 0]
+        streamed = analyzer.runStreamingAnalysis(map1, map2)
+        self.assertEqual(len(analyzer.contactResults), 0)
+        self.assertEqual(len(streamed), 148)
+        reference = self.scanned.runContactAnalysis(map1, map2, 1)
+        streamed = dict((c.title, c) for c in streamed)
+        for c in reference:
+            self.assertTrue(np.allclose(streamed[c.title].scoreArray, c.scoreArray))
+            self.assertAlmostEqual(streamed[c.title].bb1, c.bb1)
+            self.assertEqual(streamed[c.title].hbond_percentage(), c.hbond_percentage())